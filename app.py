@@ -1,15 +1,37 @@
-from flask import Flask, request, jsonify, send_from_directory, session
+from flask import Flask, request, jsonify, send_file, send_from_directory, session, Response, stream_with_context
 from flask_cors import CORS
 from functools import wraps
 import os
 import json
 import jwt
 import hashlib
+import atexit
+import signal
+import sys
+import time
 from datetime import datetime, timedelta, timezone
-import google.generativeai as genai
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import requests
+from model_catalog import ModelCatalog
+from google_certs import GoogleTokenVerifier
+from auth_cache import AuthCache
+from password_hasher import PasswordHasher, PasswordHasherBusy
+from static_assets import IMMUTABLE, REVALIDATE, StaticAssets
+from chat_journal import ChatJournal
+from message_format import new_message
+from prompt_builder import PromptBuilder
+from context_cache import ContextCache
+from storage import BACKEND_SQLITE, JsonStorage, SqliteStorage
+from write_behind import WriteBehind
+from http_pool import HttpClient
+import gemini_client
+from key_pool import KeyPool
+from hedging import Hedger
+from deadline import Deadline, DeadlineExceeded
+from response_cache import ResponseCache, context_fingerprint
+from singleflight import SingleFlight
+from retry_policy import RetryPolicy, classify, AUTH, BAD_REQUEST, CANCELLED, NOT_FOUND, RATE_LIMITED
+
+# Início da inicialização (para medir o tempo de boot do worker)
+BOOT_STARTED = time.monotonic()
 
 # Carregar variáveis de ambiente do arquivo .env
 try:
@@ -49,17 +71,98 @@ else:
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID', '')
 JWT_SECRET = os.environ.get('JWT_SECRET', app.secret_key)
 JWT_EXPIRATION_HOURS = 24
+# Tokens já validados mantidos em memória (e por quantos segundos, no máximo)
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 10000))
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 300))
+# Processos para o hash de senhas (scrypt) e quantos pedidos podem esperar antes de responder 429
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+# Tempo (em segundos) que a lista de modelos de cada chave fica em cache
+MODEL_CATALOG_TTL = int(os.environ.get('MODEL_CATALOG_TTL', 3600))
+# Pool de conexões HTTP para as APIs do Google
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+HTTP_KEEPALIVE = int(os.environ.get('HTTP_KEEPALIVE', 60))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+# Cooldown inicial (em segundos) de uma chave depois de falhar
+KEY_COOLDOWN = int(os.environ.get('KEY_COOLDOWN', 60))
+# Modelo usado quando o catálogo de modelos não está disponível
+FALLBACK_MODEL = os.environ.get('GEMINI_FALLBACK_MODEL', 'gemini-pro')
+# Quantidade máxima de mensagens do histórico enviadas no prompt
+PROMPT_HISTORY_MESSAGES = 10
+# Orçamento (estimado) de tokens para o histórico no prompt; as mensagens mais antigas ficam de fora
+PROMPT_HISTORY_TOKENS = int(os.environ.get('PROMPT_HISTORY_TOKENS', 3000))
+# Prompt do sistema guardado no Gemini (cachedContents), referenciado em vez de reenviado
+CONTEXT_CACHE_ENABLED = os.environ.get('CONTEXT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+CONTEXT_CACHE_TTL = int(os.environ.get('CONTEXT_CACHE_TTL', 3600))
+# Depois de o Gemini recusar o cache (ex.: prompt curto demais para o modelo), esperar antes de tentar de novo
+CONTEXT_CACHE_RETRY_AFTER = int(os.environ.get('CONTEXT_CACHE_RETRY_AFTER', 3600))
+# Cache de respostas para perguntas repetidas
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1000))
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 86400))
+# Camada em disco do cache (sobrevive a reinícios)
+RESPONSE_CACHE_DISK = os.environ.get('RESPONSE_CACHE_DISK', 'false').lower() in ('1', 'true', 'yes')
+# Cache semântico (perguntas parecidas); requer numpy
+SEMANTIC_CACHE_ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SEMANTIC_CACHE_SIZE = int(os.environ.get('SEMANTIC_CACHE_SIZE', 10000))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.8))
+# Prazo total (em segundos) de uma mensagem do chat, somando todas as tentativas
+CHAT_DEADLINE = float(os.environ.get('CHAT_DEADLINE', 25))
+# Prazo máximo que o cliente pode pedir no campo "deadline"
+CHAT_MAX_DEADLINE = float(os.environ.get('CHAT_MAX_DEADLINE', 60))
+# Novas tentativas para erros transitórios (5xx, timeouts) na mesma chave
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', 2))
+RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', 0.5))
+RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', 8))
+# Hedge: duplica em outra chave a chamada que demorar mais que o percentil de latência
+HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', 95))
+HEDGE_MIN_DELAY = float(os.environ.get('HEDGE_MIN_DELAY', 2.0))
+HEDGE_MAX_RATIO = float(os.environ.get('HEDGE_MAX_RATIO', 0.1))
+
+# Pool de chaves: cada requisição recebe sua chave explicitamente
+key_pool = KeyPool(GEMINI_API_KEYS, cooldown=KEY_COOLDOWN)
+
+# Política de retry por categoria de erro
+retry_policy = RetryPolicy(
+    max_retries=RETRY_MAX_ATTEMPTS,
+    base_delay=RETRY_BASE_DELAY,
+    max_delay=RETRY_MAX_DELAY
+)
 
-# Índice atual da chave sendo usada
-current_key_index = 0
+# Chamadas ao Gemini em andamento, agrupadas por prompt
+inflight_chats = SingleFlight()
+
+# Hedge entre chaves (opcional)
+hedger = Hedger(
+    percentile=HEDGE_PERCENTILE,
+    min_delay=HEDGE_MIN_DELAY,
+    max_ratio=HEDGE_MAX_RATIO
+) if HEDGE_ENABLED else None
 
-# Configurar Gemini com a primeira chave disponível
 if GEMINI_API_KEYS:
-    genai.configure(api_key=GEMINI_API_KEYS[0])
     print(f"✅ Gemini API configurada com {len(GEMINI_API_KEYS)} chave(s) disponível(eis)")
 else:
     print("⚠️ Nenhuma chave Gemini API configurada")
 
+# Cliente HTTP compartilhado (reaproveita conexões TCP/TLS entre requisições)
+http_client = HttpClient(
+    pool_size=HTTP_POOL_SIZE,
+    keepalive=HTTP_KEEPALIVE,
+    connect_timeout=HTTP_CONNECT_TIMEOUT
+)
+
+# Catálogo de modelos por chave (evita listar modelos a cada mensagem)
+model_catalog = ModelCatalog(http_client, ttl=MODEL_CATALOG_TTL)
+if GEMINI_API_KEYS:
+    model_catalog.warm(GEMINI_API_KEYS)
+
+# Certificados do Google em cache: o login com Google não busca nada na rede no caso comum
+google_verifier = GoogleTokenVerifier(http_client)
+if GOOGLE_CLIENT_ID:
+    google_verifier.warm()
+
 # Prompt do sistema para a IA
 SYSTEM_PROMPT = """Você é uma yásuge da Igreja de Jesus Cristo dos Santos dos Últimos Dias. Você será como se fosse um missionário da igreja, como se fosse um bispo. Você pode colocar nome na pessoa se ela quiser ou se você quiser, você pode colocar o próprio nome em você. Você é o mais completo, você vai responder todas as perguntas, vai confortar, você vai, se ela tiver com raiva, você vai acalmar ela. Você vai ser uma IA completa, você vai responder todas as perguntas delas, OK? Você é uma IA completa da igreja Jesus Cristo dos Santos dos Últimos Dias.
 
@@ -73,56 +176,138 @@ IMPORTANTE:
 - Use as escrituras quando apropriado e sempre aponte para Jesus Cristo como fonte de paz e esperança
 - Formate o texto de forma bonita e legível, com espaçamento adequado entre parágrafos"""
 
+# Prompt em turnos (systemInstruction + contents) limitado por tokens
+prompt_builder = PromptBuilder(SYSTEM_PROMPT, history_tokens=PROMPT_HISTORY_TOKENS)
+
+# Cache do prompt do sistema no Gemini, por chave e modelo (criado no primeiro uso)
+context_cache = ContextCache(http_client, SYSTEM_PROMPT, ttl=CONTEXT_CACHE_TTL,
+                             retry_after=CONTEXT_CACHE_RETRY_AFTER, enabled=CONTEXT_CACHE_ENABLED)
+
 # Sistema de persistência de dados
 DATA_DIR = 'data'
 USERS_FILE = os.path.join(DATA_DIR, 'users.json')
 CHAT_HISTORY_FILE = os.path.join(DATA_DIR, 'chat_history.json')
+# Histórico em JSON: um arquivo por usuário + journal com as mensagens recentes
+CHAT_HISTORY_DIR = os.path.join(DATA_DIR, 'chat_history')
+CHAT_JOURNAL_FILE = CHAT_HISTORY_FILE + '.journal'
+# Mensagens mantidas no histórico de cada usuário
+CHAT_HISTORY_MESSAGES = 20
+# Conversas mantidas em memória (LRU); as demais são lidas do disco quando o usuário volta
+CHAT_HISTORY_CACHE_SIZE = int(os.environ.get('CHAT_HISTORY_CACHE_SIZE', 1000))
+# Política de fsync do journal do histórico: always, interval ou never
+CHAT_FSYNC_POLICY = os.environ.get('CHAT_FSYNC_POLICY', 'interval')
+# Registros no journal que disparam a compactação nos arquivos dos usuários
+CHAT_JOURNAL_COMPACT_THRESHOLD = int(os.environ.get('CHAT_JOURNAL_COMPACT_THRESHOLD', 1000))
+# Backend de armazenamento de usuários e histórico: json ou sqlite
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json').lower()
+SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join(DATA_DIR, 'yasoud.sqlite3'))
+# PRAGMA synchronous do SQLite equivalente a cada política de fsync
+SQLITE_SYNCHRONOUS = {'always': 'FULL', 'interval': 'NORMAL', 'never': 'OFF'}
+# Durabilidade das gravações: sync (na requisição), batched (group commit, a requisição espera o lote) ou async
+PERSIST_MODE = os.environ.get('PERSIST_MODE', 'batched').lower()
+# Operações por lote; no modo async o lote também sai depois de PERSIST_FLUSH_INTERVAL segundos
+PERSIST_BATCH_SIZE = int(os.environ.get('PERSIST_BATCH_SIZE', 100))
+PERSIST_FLUSH_INTERVAL = float(os.environ.get('PERSIST_FLUSH_INTERVAL', 0.05))
+# Operações pendentes a partir das quais as gravações passam a esperar o próximo lote
+PERSIST_MAX_QUEUE = int(os.environ.get('PERSIST_MAX_QUEUE', 10000))
+# Onde ficam os arquivos estáticos com hash e pré-comprimidos
+STATIC_BUILD_DIR = os.environ.get('STATIC_BUILD_DIR', os.path.join(DATA_DIR, 'static'))
 
 # Criar diretório de dados se não existir
 os.makedirs(DATA_DIR, exist_ok=True)
 
-def load_users():
-    """Carrega usuários do arquivo"""
-    if os.path.exists(USERS_FILE):
-        try:
-            with open(USERS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return {email: user for email, user in data.items()}
-        except Exception as e:
-            print(f"Erro ao carregar usuários: {e}")
-            return {}
-    return {}
+def open_storage():
+    """Abre o backend de armazenamento configurado (migrando os arquivos JSON para o SQLite na primeira vez)"""
+    # Histórico de chat em JSON: journal append-only (cada mensagem grava só uma linha) + arquivos por usuário
+    chat_journal = ChatJournal(
+        CHAT_HISTORY_DIR,
+        CHAT_JOURNAL_FILE,
+        legacy_snapshot=CHAT_HISTORY_FILE,
+        fsync_policy=CHAT_FSYNC_POLICY,
+        compact_threshold=CHAT_JOURNAL_COMPACT_THRESHOLD,
+        max_messages=CHAT_HISTORY_MESSAGES,
+        cache_size=CHAT_HISTORY_CACHE_SIZE
+    )
+    if STORAGE_BACKEND != BACKEND_SQLITE:
+        return JsonStorage(USERS_FILE, chat_journal).load()
+    
+    sqlite_storage = SqliteStorage(
+        SQLITE_PATH,
+        max_messages=CHAT_HISTORY_MESSAGES,
+        synchronous=SQLITE_SYNCHRONOUS.get(CHAT_FSYNC_POLICY, 'NORMAL')
+    )
+    if sqlite_storage.count_users() == 0 and os.path.exists(USERS_FILE):
+        json_storage = JsonStorage(USERS_FILE, chat_journal, exclusive=False).load()
+        json_storage.close()
+        if sqlite_storage.import_json(json_storage.users, chat_journal.iter_histories()):
+            print(f"✅ {len(json_storage.users)} usuário(s) migrado(s) dos arquivos JSON para {SQLITE_PATH}")
+    return sqlite_storage
 
-def save_users():
-    """Salva usuários no arquivo"""
-    try:
-        with open(USERS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(users_db, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Erro ao salvar usuários: {e}")
+# Carregar dados ao iniciar; as gravações passam pela fila de persistência em segundo plano
+storage = WriteBehind(
+    open_storage(),
+    mode=PERSIST_MODE,
+    batch_size=PERSIST_BATCH_SIZE,
+    interval=PERSIST_FLUSH_INTERVAL,
+    max_queue=PERSIST_MAX_QUEUE
+)
+# Gravar o que estiver pendente ao sair (no Gunicorn, o hook worker_exit também chama storage.close)
+atexit.register(storage.close)
 
-def load_chat_history():
-    """Carrega histórico de chat do arquivo"""
-    if os.path.exists(CHAT_HISTORY_FILE):
-        try:
-            with open(CHAT_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Erro ao carregar histórico: {e}")
-            return {}
-    return {}
+# Tokens já validados -> usuário
+auth_cache = AuthCache(max_entries=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+# Hash de senhas fora do worker
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_MAX_PENDING,
+    timeout=PASSWORD_HASH_TIMEOUT
+)
+atexit.register(password_hasher.close)
 
-def save_chat_history():
-    """Salva histórico de chat no arquivo"""
+# Cache de respostas (opcional, com camada em disco)
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+    disk_path=os.path.join(DATA_DIR, 'response_cache.sqlite3') if RESPONSE_CACHE_DISK else None
+) if RESPONSE_CACHE_ENABLED else None
+
+# Cache semântico (desligado se o numpy não estiver instalado)
+semantic_cache = None
+if SEMANTIC_CACHE_ENABLED:
     try:
-        with open(CHAT_HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(chat_history, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Erro ao salvar histórico: {e}")
+        from semantic_cache import SemanticCache
+        semantic_cache = SemanticCache(
+            max_entries=SEMANTIC_CACHE_SIZE,
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            ttl=RESPONSE_CACHE_TTL
+        )
+    except ImportError:
+        print("⚠️ numpy não instalado, cache semântico desligado")
 
-# Carregar dados ao iniciar
-users_db = load_users()
-chat_history = load_chat_history()
+# Arquivos estáticos com hash no nome (se falhar, a página é servida como antes)
+try:
+    static_assets = StaticAssets(os.path.dirname(os.path.abspath(__file__)), STATIC_BUILD_DIR).build()
+except Exception as e:
+    static_assets = None
+    print(f"⚠️ Erro ao preparar os arquivos estáticos: {e}")
+
+# Tempo de inicialização do worker (não cresce com o número de usuários: nenhum histórico é carregado)
+BOOT_SECONDS = time.monotonic() - BOOT_STARTED
+
+def process_stats():
+    """Tempo de inicialização e memória residente (RSS) deste worker"""
+    rss_mb = None
+    try:
+        with open('/proc/self/statm') as f:
+            rss_mb = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        pass  # fora do Linux
+    return {
+        'pid': os.getpid(),
+        'startup_seconds': round(BOOT_SECONDS, 3),
+        'rss_mb': round(rss_mb, 1) if rss_mb is not None else None
+    }
 
 def generate_token(user_id):
     """Gera um token JWT para o usuário"""
@@ -143,6 +328,26 @@ def verify_token(token):
     except jwt.InvalidTokenError:
         return None
 
+def authenticate(token):
+    """Contexto do usuário de um token válido, do cache ou decodificando o JWT; None se inválido"""
+    context = auth_cache.get(token)
+    if context is not None:
+        return context
+
+    payload = verify_token(token)
+    if not payload:
+        return None
+
+    user = storage.get_user_by_id(payload['user_id'])
+    public_user = {'id': user['id'], 'name': user['name'], 'email': user['email']} if user else None
+    context = {
+        'user_id': payload['user_id'],
+        'user': public_user,
+        'etag': hashlib.sha256(json.dumps(public_user, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+    }
+    auth_cache.put(token, context, payload['exp'])
+    return context
+
 def require_auth(f):
     """Decorator para rotas que requerem autenticação"""
     @wraps(f)
@@ -159,18 +364,49 @@ def require_auth(f):
         if not token:
             return jsonify({'message': 'Token de autenticação necessário'}), 401
         
-        payload = verify_token(token)
-        if not payload:
+        context = authenticate(token)
+        if not context:
             return jsonify({'message': 'Token inválido ou expirado'}), 401
         
-        request.user_id = payload['user_id']
+        request.user_id = context['user_id']
         return f(*args, **kwargs)
     
     return decorated_function
 
+def busy_response():
+    """Pool de hash de senhas saturado: pedir para o cliente tentar de novo"""
+    response = jsonify({'message': 'Muitas tentativas simultâneas, tente novamente em instantes'})
+    response.headers['Retry-After'] = '1'
+    return response, 429
+
+def send_asset(asset, cache_control):
+    """Envia a melhor versão do arquivo para o navegador (codificação, formato e largura da imagem)"""
+    encodings = [value for value, quality in request.accept_encodings if quality > 0]
+    # Só tipos listados explicitamente (image/* e */* não garantem suporte a AVIF ou WebP)
+    image_types = [value for value, quality in request.accept_mimetypes if quality > 0]
+    path, mimetype, encoding, etag = asset.select(encodings, image_types, request.args.get('w', type=int))
+    response = send_file(path, mimetype=mimetype, etag=etag, conditional=True)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if asset.variants:
+        response.vary.add('Accept')
+    response.headers['Cache-Control'] = cache_control
+    return response
+
 @app.route('/')
 def index():
-    return send_from_directory('.', 'index.html')
+    if static_assets is None:
+        return send_from_directory('.', 'index.html')
+    # O index.html é sempre revalidado (304 se não mudou); o resto tem hash no nome e não expira
+    return send_asset(static_assets.index, REVALIDATE)
+
+@app.route('/assets/<path:filename>')
+def hashed_asset(filename):
+    asset = static_assets.lookup(filename) if static_assets is not None else None
+    if asset is None:
+        return jsonify({'message': 'Arquivo não encontrado'}), 404
+    return send_asset(asset, IMMUTABLE)
 
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -183,13 +419,12 @@ def register():
         if not name or not email or not password:
             return jsonify({'message': 'Todos os campos são obrigatórios'}), 400
         
-        if email in users_db:
+        if storage.get_user_by_email(email):
             return jsonify({'message': 'Email já cadastrado'}), 400
         
-        # Hash simples da senha (em produção, use bcrypt)
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
+        password_hash = password_hasher.hash(password)
         
-        user_id = str(len(users_db) + 1)
+        user_id = storage.allocate_user_id()
         user = {
             'id': user_id,
             'name': name,
@@ -198,12 +433,7 @@ def register():
             'created_at': datetime.now(timezone.utc).isoformat()
         }
         
-        users_db[email] = user
-        chat_history[user_id] = []
-        
-        # Salvar no arquivo
-        save_users()
-        save_chat_history()
+        storage.add_user(user)
         
         token = generate_token(user_id)
         
@@ -217,6 +447,8 @@ def register():
             'token': token
         }), 201
         
+    except PasswordHasherBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({'message': f'Erro ao criar usuário: {str(e)}'}), 500
 
@@ -230,14 +462,19 @@ def login():
         if not email or not password:
             return jsonify({'message': 'Email e senha são obrigatórios'}), 400
         
-        user = users_db.get(email)
+        user = storage.get_user_by_email(email)
         if not user:
             return jsonify({'message': 'Email ou senha incorretos'}), 401
         
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        if user['password_hash'] != password_hash:
+        ok, new_hash = password_hasher.verify(password, user['password_hash'])
+        if not ok:
             return jsonify({'message': 'Email ou senha incorretos'}), 401
         
+        if new_hash:
+            # Hash antigo (SHA-256): gravar no formato atual
+            user['password_hash'] = new_hash
+            storage.update_user(user, user['email'])
+        
         token = generate_token(user['id'])
         
         return jsonify({
@@ -250,6 +487,8 @@ def login():
             'token': token
         }), 200
         
+    except PasswordHasherBusy:
+        return busy_response()
     except Exception as e:
         return jsonify({'message': f'Erro ao fazer login: {str(e)}'}), 500
 
@@ -293,27 +532,23 @@ def google_callback():
                         'grant_type': 'authorization_code'
                     }
                     
-                    token_response = requests.post(token_url, data=token_data)
+                    token_response = http_client.post(token_url, data=token_data, timeout=10)
                     if token_response.ok:
                         token_json = token_response.json()
                         id_token_str = token_json.get('id_token')
                         
                         if id_token_str:
                             # Verificar o token
-                            idinfo = id_token.verify_oauth2_token(
-                                id_token_str, 
-                                google_requests.Request(), 
-                                GOOGLE_CLIENT_ID
-                            )
+                            idinfo = google_verifier.verify(id_token_str, GOOGLE_CLIENT_ID)
                             
                             email = idinfo.get('email')
                             name = idinfo.get('name', email.split('@')[0])
                             
                             # Verificar se o usuário já existe
-                            user = users_db.get(email)
+                            user = storage.get_user_by_email(email)
                             if not user:
                                 # Criar novo usuário
-                                user_id = str(len(users_db) + 1)
+                                user_id = storage.allocate_user_id()
                                 user = {
                                     'id': user_id,
                                     'name': name,
@@ -322,10 +557,7 @@ def google_callback():
                                     'created_at': datetime.now(timezone.utc).isoformat(),
                                     'google_user': True
                                 }
-                                users_db[email] = user
-                                chat_history[user_id] = []
-                                save_users()
-                                save_chat_history()
+                                storage.add_user(user)
                             else:
                                 user_id = user['id']
                             
@@ -364,20 +596,16 @@ def google_callback():
         
         # Verificar o token do Google
         try:
-            idinfo = id_token.verify_oauth2_token(
-                token, 
-                google_requests.Request(), 
-                GOOGLE_CLIENT_ID
-            )
+            idinfo = google_verifier.verify(token, GOOGLE_CLIENT_ID)
             
             email = idinfo.get('email')
             name = idinfo.get('name', email.split('@')[0])
             
             # Verificar se o usuário já existe
-            user = users_db.get(email)
+            user = storage.get_user_by_email(email)
             if not user:
                 # Criar novo usuário
-                user_id = str(len(users_db) + 1)
+                user_id = storage.allocate_user_id()
                 user = {
                     'id': user_id,
                     'name': name,
@@ -386,11 +614,7 @@ def google_callback():
                     'created_at': datetime.now(timezone.utc).isoformat(),
                     'google_user': True
                 }
-                users_db[email] = user
-                chat_history[user_id] = []
-                # Salvar no arquivo
-                save_users()
-                save_chat_history()
+                storage.add_user(user)
             else:
                 user_id = user['id']
             
@@ -427,33 +651,26 @@ def verify():
     if not token:
         return jsonify({'valid': False}), 401
     
-    payload = verify_token(token)
-    if not payload:
-        return jsonify({'valid': False}), 401
-    
-    user_id = payload['user_id']
-    # Encontrar usuário
-    user = None
-    for email, u in users_db.items():
-        if u['id'] == user_id:
-            user = u
-            break
-    
-    if not user:
+    context = authenticate(token)
+    if not context or not context['user']:
         return jsonify({'valid': False}), 401
     
-    return jsonify({
+    # O script.js verifica o token a cada carregamento: com o ETag, o navegador revalida e recebe 304
+    response = jsonify({
         'valid': True,
-        'user': {
-            'id': user['id'],
-            'name': user['name'],
-            'email': user['email']
-        }
-    }), 200
+        'user': context['user']
+    })
+    response.set_etag(context['etag'])
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Authorization')
+    return response.make_conditional(request)
 
 @app.route('/api/auth/logout', methods=['POST'])
 def logout():
     """Faz logout do usuário"""
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        auth_cache.invalidate_token(auth_header[len('Bearer '):])
     return jsonify({'message': 'Logout realizado com sucesso'}), 200
 
 @app.route('/api/profile/update', methods=['POST'])
@@ -464,15 +681,7 @@ def update_profile():
         data = request.get_json()
         user_id = request.user_id
         
-        # Encontrar usuário
-        user = None
-        user_email = None
-        for email, u in users_db.items():
-            if u['id'] == user_id:
-                user = u
-                user_email = email
-                break
-        
+        user = storage.get_user_by_id(user_id)
         if not user:
             return jsonify({'message': 'Usuário não encontrado'}), 404
         
@@ -485,22 +694,20 @@ def update_profile():
             return jsonify({'message': 'Nome e e-mail são obrigatórios'}), 400
         
         # Se o email mudou, verificar se já existe
-        if email != user_email and email in users_db:
+        user_email = user['email']
+        if email != user_email and storage.get_user_by_email(email):
             return jsonify({'message': 'Este e-mail já está em uso'}), 400
         
         # Atualizar usuário
-        if email != user_email:
-            # Remover do email antigo e adicionar no novo
-            del users_db[user_email]
-            user['email'] = email
-        
+        user['email'] = email
         user['name'] = name
         user['phone'] = phone
+        # Permite desligar o cache de respostas para este usuário
+        if 'response_cache' in data:
+            user['response_cache_opt_out'] = not data.get('response_cache')
         
-        users_db[email] = user
-        
-        # Salvar no arquivo
-        save_users()
+        storage.update_user(user, user_email)
+        auth_cache.invalidate_user(user_id)
         
         return jsonify({
             'message': 'Perfil atualizado com sucesso',
@@ -508,13 +715,212 @@ def update_profile():
                 'id': user['id'],
                 'name': user['name'],
                 'email': user['email'],
-                'phone': user.get('phone', '')
+                'phone': user.get('phone', ''),
+                'response_cache': not user.get('response_cache_opt_out', False)
             }
         }), 200
         
     except Exception as e:
         return jsonify({'message': f'Erro ao atualizar perfil: {str(e)}'}), 500
 
+# Resposta padrão quando nenhuma chave consegue responder
+FALLBACK_REPLY = "Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente. Lembre-se de que você é um filho amado de Deus e Ele está sempre ao seu lado."
+# Resposta padrão se a API não estiver configurada
+NOT_CONFIGURED_REPLY = 'Desculpe, o serviço de IA não está configurado no momento. Por favor, configure a chave da API do Gemini.'
+
+def message_text(msg):
+    """Retorna o texto de uma mensagem do histórico"""
+    return msg.get('parts', [msg.get('text', '')])[0] if isinstance(msg.get('parts'), list) else msg.get('text', '')
+
+def cache_context(user_id, history):
+    """Impressão digital do contexto do prompt para os caches (None se o usuário desligou o cache)"""
+    if response_cache is None and semantic_cache is None:
+        return None
+    user = storage.get_user_by_id(user_id)
+    if user and user.get('response_cache_opt_out'):
+        return None
+    history_texts = [f"{msg.get('role')}:{message_text(msg)}" for msg in history[-PROMPT_HISTORY_MESSAGES:]]
+    return context_fingerprint(SYSTEM_PROMPT, history_texts)
+
+def cached_reply(context, message):
+    """Procura a resposta no cache exato e depois no cache semântico"""
+    if context is None:
+        return None
+    if response_cache is not None:
+        reply = response_cache.get(ResponseCache.make_key(context, message))
+        if reply:
+            return reply
+    if semantic_cache is not None:
+        reply, _ = semantic_cache.lookup(message, context)
+        if reply:
+            return reply
+    return None
+
+def store_reply(context, message, reply):
+    """Guarda uma resposta do Gemini nos caches"""
+    if context is None:
+        return
+    if response_cache is not None:
+        response_cache.put(ResponseCache.make_key(context, message), reply)
+    if semantic_cache is not None:
+        semantic_cache.add(message, context, reply)
+
+def record_chat_turn(user_id, message, assistant_message):
+    """Adiciona a mensagem do usuário e a resposta da IA ao histórico"""
+    storage.append_messages(user_id, [
+        new_message('user', message),
+        new_message('model', assistant_message)
+    ])
+
+def request_deadline(data):
+    """Cria o prazo da requisição (o cliente pode pedir um prazo menor ou maior, até o limite)"""
+    seconds = CHAT_DEADLINE
+    try:
+        if data.get('deadline') is not None:
+            seconds = min(CHAT_MAX_DEADLINE, max(1.0, float(data.get('deadline'))))
+    except (TypeError, ValueError):
+        pass
+    return Deadline(seconds)
+
+def sse_event(event, data):
+    """Formata um evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def record_usage(usage, context_cached):
+    """Registra o usageMetadata do Gemini no prompt e na comparação com/sem cache de contexto"""
+    prompt_builder.record_usage(usage)
+    context_cache.record_usage(usage, context_cached)
+
+def call_generate(api_version, model, api_key, payload, timeout, context_cached=False):
+    """Chama generateContent medindo a latência com ou sem o cache de contexto"""
+    started = time.monotonic()
+    text = gemini_client.generate(http_client, api_version, model, api_key, payload, timeout=timeout,
+                                  on_usage=lambda usage: record_usage(usage, context_cached))
+    context_cache.record_latency(time.monotonic() - started, context_cached)
+    return text
+
+def context_cache_failed(api_key, model, error):
+    """Trata o erro de uma chamada com o cache de contexto; True se vale repetir sem o cache"""
+    category = classify(error)
+    if category not in (AUTH, NOT_FOUND, BAD_REQUEST):
+        return False
+    # 403/404: cache vencido ou apagado, criar outro; 400: o modelo não aceita o cache
+    context_cache.invalidate(api_key, model, disable=category == BAD_REQUEST)
+    print(f"Cache de contexto recusado ({model}), enviando o prompt completo: {error}")
+    return True
+
+def generate_with_key(api_key, payload, deadline):
+    """Gera a resposta com uma chave específica (cache de contexto, v1, depois v1beta).
+
+    Cada etapa usa só parte do prazo restante para sobrar tempo para as
+    próximas; erros transitórios são repetidos pela política de retry.
+    """
+    # Usar o catálogo de modelos disponíveis (em cache)
+    try:
+        available_models = model_catalog.get(api_key, timeout=deadline.timeout(10, share=0.25))
+    except Exception as e1:
+        # Cota, chave inválida ou prazo: não adianta insistir com esta chave
+        if classify(e1) in (RATE_LIMITED, AUTH, CANCELLED, BAD_REQUEST):
+            raise
+        print(f"Erro ao listar modelos: {e1}")
+        # Fallback: modelo padrão, sem depender do catálogo
+        return retry_policy.call(lambda: call_generate(
+            'v1beta', FALLBACK_MODEL, api_key, payload, deadline.timeout(30)
+        ), deadline)
+    
+    if not available_models:
+        raise Exception("Nenhum modelo disponível encontrado")
+    
+    # Tentar usar o primeiro modelo disponível
+    model_to_use = available_models[0]
+    
+    # Com o prompt do sistema em cache, a requisição só o referencia (v1beta)
+    cache_name = context_cache.get(api_key, model_to_use)
+    if cache_name:
+        try:
+            return retry_policy.call(lambda: call_generate(
+                'v1beta', model_to_use, api_key, gemini_client.with_cached_content(payload, cache_name),
+                deadline.timeout(30, share=0.6), context_cached=True
+            ), deadline)
+        except Exception as e_cache:
+            if not context_cache_failed(api_key, model_to_use, e_cache):
+                raise
+    
+    try:
+        return retry_policy.call(lambda: call_generate(
+            'v1', model_to_use, api_key, payload, deadline.timeout(30, share=0.6)
+        ), deadline)
+    except Exception as e_v1:
+        # Só vale tentar a v1beta se o modelo não existir na v1 (ou se a v1 recusar o systemInstruction)
+        if classify(e_v1) not in (NOT_FOUND, BAD_REQUEST):
+            raise
+        print(f"v1 falhou: {str(e_v1)}")
+        try:
+            return retry_policy.call(lambda: call_generate(
+                'v1beta', model_to_use, api_key, payload, deadline.timeout(30)
+            ), deadline)
+        except Exception as e:
+            # Modelo não encontrado: o catálogo desta chave está desatualizado
+            if classify(e) == NOT_FOUND:
+                model_catalog.invalidate(api_key)
+            raise
+
+def generate_reply(payload, deadline):
+    """Gera a resposta da IA escolhendo as chaves pelo pool (None se todas falharem ou o prazo acabar)"""
+    tried = set()
+    last_error = None
+    
+    def release_key(key, error, cancelled):
+        key_pool.release(key, error=error, cancelled=cancelled)
+    
+    while not deadline.expired():
+        api_key = key_pool.acquire(exclude=tried)
+        if api_key is None:
+            break
+        tried.add(api_key)
+        
+        if hedger is not None:
+            def next_key():
+                hedge_key = key_pool.acquire(exclude=tried)
+                if hedge_key is not None:
+                    tried.add(hedge_key)
+                return hedge_key
+            
+            _, response_text, errors = hedger.run(
+                lambda key: generate_with_key(key, payload, deadline), api_key, next_key, release_key,
+                deadline=deadline
+            )
+            if response_text:
+                return response_text
+            for key, e in errors:
+                last_error = e
+                print(f"Erro com chave ...{key[-4:]}: {str(e)}")
+            # Requisição inválida falha em qualquer chave: não insistir
+            if any(classify(e) == BAD_REQUEST for _, e in errors):
+                break
+            continue
+        
+        try:
+            response_text = generate_with_key(api_key, payload, deadline)
+            if not response_text:
+                raise Exception("Resposta vazia do Gemini")
+        except Exception as e:
+            last_error = e
+            key_pool.release(api_key, error=e)
+            print(f"Erro com chave ...{api_key[-4:]}: {str(e)}")
+            # Requisição inválida falha em qualquer chave: não insistir
+            if classify(e) == BAD_REQUEST:
+                break
+            continue
+        
+        key_pool.release(api_key)
+        return response_text
+    
+    if deadline.expired():
+        last_error = last_error or DeadlineExceeded(f"Prazo de {deadline.seconds:.1f}s esgotado")
+    print(f"Todas as chaves falharam. Último erro: {last_error}")
+    return None
+
 @app.route('/api/chat', methods=['POST'])
 @require_auth
 def chat():
@@ -527,177 +933,45 @@ def chat():
             return jsonify({'message': 'Mensagem não fornecida'}), 400
         
         if not GEMINI_API_KEYS:
-            # Resposta padrão se a API não estiver configurada
             return jsonify({
-                'response': 'Desculpe, o serviço de IA não está configurado no momento. Por favor, configure a chave da API do Gemini.'
+                'response': NOT_CONFIGURED_REPLY
             }), 200
         
         user_id = request.user_id
         
         # Obter histórico de conversa do usuário
-        history = chat_history.get(user_id, [])
+        history = storage.recent_messages(user_id, PROMPT_HISTORY_MESSAGES)
         
-        # Configurar o modelo Gemini com rotação de chaves
-        assistant_message = None
-        last_error = None
+        # Preparar o prompt com o histórico que couber no orçamento de tokens
+        payload, prompt_tokens = prompt_builder.build(user_id, history, message)
+        
+        # Perguntas repetidas (ou parecidas) são respondidas pelo cache, sem chamar o Gemini
+        context = cache_context(user_id, history)
+        assistant_message = cached_reply(context, message)
         
-        # Tentar com cada chave disponível
-        for attempt in range(len(GEMINI_API_KEYS)):
-            try:
-                # Usar a chave atual (rotacionando)
-                global current_key_index
-                api_key = GEMINI_API_KEYS[current_key_index]
-                genai.configure(api_key=api_key)
-                
-                # Preparar o prompt completo com histórico
-                conversation_parts = []
-                
-                # Adicionar histórico recente
-                for msg in history[-10:]:  # Últimas 10 mensagens
-                    if msg.get('role') == 'user':
-                        text = msg.get('parts', [msg.get('text', '')])[0] if isinstance(msg.get('parts'), list) else msg.get('text', '')
-                        conversation_parts.append(f"Usuário: {text}")
-                    elif msg.get('role') == 'model':
-                        text = msg.get('parts', [msg.get('text', '')])[0] if isinstance(msg.get('parts'), list) else msg.get('text', '')
-                        conversation_parts.append(f"YASOUD: {text}")
-                
-                # Construir prompt completo
-                if conversation_parts:
-                    history_text = "\n".join(conversation_parts)
-                    full_prompt = f"{SYSTEM_PROMPT}\n\n{history_text}\n\nUsuário: {message}\nYASOUD:"
-                else:
-                    full_prompt = f"{SYSTEM_PROMPT}\n\nUsuário: {message}\nYASOUD:"
-                
-                # Tentar usar a biblioteca google-generativeai com diferentes abordagens
-                response_text = None
-                last_api_error = None
-                
-                # Método 1: Tentar listar modelos disponíveis primeiro
-                try:
-                    import urllib.request
-                    import json as json_lib
-                    
-                    # Listar modelos disponíveis
-                    list_url = f"https://generativelanguage.googleapis.com/v1/models?key={api_key}"
-                    list_req = urllib.request.Request(list_url, method='GET')
-                    
-                    with urllib.request.urlopen(list_req, timeout=10) as f:
-                        models_result = json_lib.loads(f.read().decode())
-                        available_models = []
-                        if 'models' in models_result:
-                            for m in models_result['models']:
-                                model_name = m.get('name', '')
-                                # Filtrar apenas modelos que suportam generateContent
-                                if 'generateContent' in m.get('supportedGenerationMethods', []):
-                                    # Extrair nome curto do modelo (ex: "gemini-pro" de "models/gemini-pro")
-                                    short_name = model_name.split('/')[-1] if '/' in model_name else model_name
-                                    available_models.append(short_name)
-                    
-                    print(f"Modelos disponíveis: {available_models}")
-                    
-                    # Tentar usar o primeiro modelo disponível
-                    if available_models:
-                        model_to_use = available_models[0]
-                        print(f"Tentando usar modelo: {model_to_use}")
-                        
-                        # Tentar v1 primeiro
-                        try:
-                            url = f"https://generativelanguage.googleapis.com/v1/models/{model_to_use}:generateContent?key={api_key}"
-                            data = {
-                                "contents": [{
-                                    "parts": [{"text": full_prompt}]
-                                }]
-                            }
-                            req = urllib.request.Request(
-                                url, 
-                                data=json_lib.dumps(data).encode(), 
-                                headers={'Content-Type': 'application/json'},
-                                method='POST'
-                            )
-                            
-                            with urllib.request.urlopen(req, timeout=30) as f:
-                                result = json_lib.loads(f.read().decode())
-                                if 'candidates' in result and len(result['candidates']) > 0:
-                                    if 'content' in result['candidates'][0] and 'parts' in result['candidates'][0]['content']:
-                                        response_text = result['candidates'][0]['content']['parts'][0]['text']
-                        except Exception as e_v1:
-                            last_api_error = f"v1 falhou: {str(e_v1)}"
-                            # Tentar v1beta
-                            try:
-                                url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_to_use}:generateContent?key={api_key}"
-                                req = urllib.request.Request(
-                                    url, 
-                                    data=json_lib.dumps(data).encode(), 
-                                    headers={'Content-Type': 'application/json'},
-                                    method='POST'
-                                )
-                                
-                                with urllib.request.urlopen(req, timeout=30) as f:
-                                    result = json_lib.loads(f.read().decode())
-                                    if 'candidates' in result and len(result['candidates']) > 0:
-                                        if 'content' in result['candidates'][0] and 'parts' in result['candidates'][0]['content']:
-                                            response_text = result['candidates'][0]['content']['parts'][0]['text']
-                            except Exception as e:
-                                last_api_error = f"v1beta também falhou: {str(e)}"
-                    else:
-                        last_api_error = "Nenhum modelo disponível encontrado"
-                except Exception as e1:
-                    last_api_error = str(e1)
-                    print(f"Erro ao listar modelos: {e1}")
-                    
-                    # Fallback: Tentar métodos diretos
-                    try:
-                        model = genai.GenerativeModel('gemini-pro')
-                        response = model.generate_content(full_prompt)
-                        if response and hasattr(response, 'text') and response.text:
-                            response_text = response.text
-                    except Exception as e2:
-                        last_api_error = str(e2)
-                        print(f"Fallback também falhou: {e2}")
-                
-                if not response_text:
-                    raise Exception(f"Todos os métodos falharam. Último erro: {last_api_error}")
-                
-                assistant_message = response_text
-                
-                # Se chegou aqui, a chave funcionou
-                break
-                
-            except Exception as e:
-                last_error = str(e)
-                print(f"Erro com chave {current_key_index + 1}/{len(GEMINI_API_KEYS)}: {str(e)}")
-                # Rotacionar para a próxima chave
-                current_key_index = (current_key_index + 1) % len(GEMINI_API_KEYS)
-                # Se não for a última tentativa, continuar
-                if attempt < len(GEMINI_API_KEYS) - 1:
-                    continue
-        
-        # Se nenhuma chave funcionou
         if not assistant_message:
-            print(f"Todas as chaves falharam. Último erro: {last_error}")
-            assistant_message = "Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente. Lembre-se de que você é um filho amado de Deus e Ele está sempre ao seu lado."
-        
-        # Adicionar mensagem do usuário e resposta da IA ao histórico
-        history.append({
-            'role': 'user',
-            'parts': [message],
-            'text': message
-        })
-        history.append({
-            'role': 'model',
-            'parts': [assistant_message],
-            'text': assistant_message
-        })
-        
-        # Manter apenas as últimas 20 mensagens no histórico
-        chat_history[user_id] = history[-20:]
-        
-        # Salvar histórico no arquivo
-        save_chat_history()
+            deadline = request_deadline(data)
+            
+            def ask_gemini():
+                reply = generate_reply(payload, deadline)
+                if reply:
+                    store_reply(context, message, reply)
+                return reply
+            
+            # Prompts idênticos em andamento (ex: clique duplo) compartilham a mesma chamada ao Gemini
+            prompt_key = hashlib.sha256(
+                json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+            ).hexdigest()
+            assistant_message, _ = inflight_chats.do(prompt_key, ask_gemini, timeout=deadline.remaining())
+        
+        # Se nenhuma chave funcionou (ou o prazo acabou), usar a resposta padrão
+        assistant_message = assistant_message or FALLBACK_REPLY
+        
+        record_chat_turn(user_id, message, assistant_message)
         
         return jsonify({
             'response': assistant_message
-        }), 200
+        }), 200, {'X-Prompt-Tokens': str(prompt_tokens)}
         
     except Exception as e:
         print(f"Erro no chat: {str(e)}")
@@ -706,7 +980,155 @@ def chat():
             'response': 'Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente.'
         }), 500
 
+def open_chat_stream(payload, deadline):
+    """Abre o stream do Gemini com a primeira chave que responder.
+
+    Retorna (chave, resposta aberta, se usou o cache de contexto); a chave
+    deve ser devolvida ao pool quando o stream terminar. O prazo limita a
+    espera até o stream começar.
+    """
+    tried = set()
+    last_error = None
+    
+    while not deadline.expired():
+        api_key = key_pool.acquire(exclude=tried)
+        if api_key is None:
+            break
+        tried.add(api_key)
+        try:
+            available_models = model_catalog.get(api_key, timeout=deadline.timeout(10, share=0.25))
+            if not available_models:
+                raise Exception("Nenhum modelo disponível encontrado")
+            
+            cache_name = context_cache.get(api_key, available_models[0])
+            if cache_name:
+                try:
+                    return api_key, retry_policy.call(lambda: gemini_client.open_stream(
+                        http_client, 'v1beta', available_models[0], api_key,
+                        gemini_client.with_cached_content(payload, cache_name), timeout=deadline.timeout(30, share=0.6)
+                    ), deadline), True
+                except Exception as e_cache:
+                    if not context_cache_failed(api_key, available_models[0], e_cache):
+                        raise
+            
+            try:
+                return api_key, retry_policy.call(lambda: gemini_client.open_stream(
+                    http_client, 'v1', available_models[0], api_key, payload, timeout=deadline.timeout(30, share=0.6)
+                ), deadline), False
+            except Exception as e_v1:
+                if classify(e_v1) not in (NOT_FOUND, BAD_REQUEST):
+                    raise
+                try:
+                    return api_key, retry_policy.call(lambda: gemini_client.open_stream(
+                        http_client, 'v1beta', available_models[0], api_key, payload, timeout=deadline.timeout(30)
+                    ), deadline), False
+                except Exception as e:
+                    if classify(e) == NOT_FOUND:
+                        model_catalog.invalidate(api_key)
+                    raise
+        except Exception as e:
+            last_error = e
+            key_pool.release(api_key, error=e)
+            print(f"Erro com chave ...{api_key[-4:]} (stream): {str(e)}")
+            if classify(e) == BAD_REQUEST:
+                break
+    
+    print(f"Todas as chaves falharam (stream). Último erro: {last_error}")
+    return None, None, False
+
+@app.route('/api/chat/stream', methods=['POST'])
+@require_auth
+def chat_stream():
+    """Endpoint de chat que envia a resposta em tempo real via Server-Sent Events"""
+    data = request.get_json() or {}
+    message = data.get('message')
+    
+    if not message:
+        return jsonify({'message': 'Mensagem não fornecida'}), 400
+    
+    user_id = request.user_id
+    history = storage.recent_messages(user_id, PROMPT_HISTORY_MESSAGES)
+    payload, prompt_tokens = prompt_builder.build(user_id, history, message)
+    deadline = request_deadline(data)
+    context = cache_context(user_id, history)
+    
+    def generate():
+        if not GEMINI_API_KEYS:
+            yield sse_event('done', {'response': NOT_CONFIGURED_REPLY})
+            return
+        
+        cached = cached_reply(context, message)
+        if cached:
+            record_chat_turn(user_id, message, cached)
+            yield sse_event('token', {'text': cached})
+            yield sse_event('done', {'response': cached})
+            return
+        
+        parts = []
+        stream_error = None
+        started = time.monotonic()
+        api_key, upstream, context_cached = open_chat_stream(payload, deadline)
+        try:
+            if upstream is not None:
+                try:
+                    for text in gemini_client.iter_stream_text(
+                        upstream, on_usage=lambda usage: record_usage(usage, context_cached)
+                    ):
+                        if not parts:
+                            context_cache.record_latency(time.monotonic() - started, context_cached, stream=True)
+                        parts.append(text)
+                        yield sse_event('token', {'text': text})
+                except Exception as e:
+                    stream_error = e
+                    print(f"Erro durante o stream: {str(e)}")
+            
+            assistant_message = ''.join(parts)
+            if assistant_message and stream_error is None:
+                store_reply(context, message, assistant_message)
+            if not assistant_message:
+                assistant_message = FALLBACK_REPLY
+                yield sse_event('token', {'text': assistant_message})
+            
+            # O histórico só é salvo quando o stream termina
+            record_chat_turn(user_id, message, assistant_message)
+            yield sse_event('done', {'response': assistant_message})
+        finally:
+            # Se o cliente desconectar, fechar a resposta cancela a chamada ao Gemini
+            if upstream is not None:
+                upstream.close()
+                key_pool.release(api_key, error=stream_error)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        'X-Prompt-Tokens': str(prompt_tokens)
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Retorna contadores internos de desempenho"""
+    return jsonify({
+        'http_pool': http_client.stats(),
+        'model_catalog': model_catalog.stats(),
+        'google_certs': google_verifier.stats(),
+        'api_keys': key_pool.stats(),
+        'hedging': hedger.stats() if hedger is not None else None,
+        'retry': retry_policy.stats(),
+        'response_cache': response_cache.stats() if response_cache is not None else None,
+        'semantic_cache': semantic_cache.stats() if semantic_cache is not None else None,
+        'coalescing': inflight_chats.stats(),
+        'prompt': prompt_builder.stats(),
+        'context_cache': context_cache.stats(),
+        'auth_cache': auth_cache.stats(),
+        'password_hashing': password_hasher.stats(),
+        'storage': storage.stats(),
+        'static_assets': static_assets.stats() if static_assets is not None else None,
+        'process': process_stats()
+    }), 200
+
 if __name__ == '__main__':
+    # SIGTERM vira uma saída normal, para que o atexit grave os dados pendentes
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
     app.run(host='0.0.0.0', port=port, debug=debug)
@@ -0,0 +1,78 @@
+"""Cache de tokens já validados (token JWT -> contexto do usuário)"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class AuthCache:
+    """LRU de tokens já decodificados e do usuário correspondente.
+
+    Cada entrada vale até o `exp` do token ou por `ttl` segundos, o que vier
+    primeiro: mudança de perfil e logout removem as entradas só neste
+    processo, e o `ttl` limita o quanto outro worker fica desatualizado.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # token -> (contexto, expira_em)
+        self._tokens_by_user = {}  # user_id -> tokens em cache
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, token):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                self._remove(token)
+            self.misses += 1
+            return None
+
+    def put(self, token, context, exp):
+        """Guarda o contexto (com 'user_id') até o `exp` do token (timestamp)"""
+        expires_at = min(exp, time.time() + self.ttl)
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (context, expires_at)
+            self._tokens_by_user.setdefault(context['user_id'], set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_token(self, token):
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id):
+        """Remove todos os tokens do usuário (ex.: depois de mudar o perfil)"""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
+
+    def _remove(self, token):
+        # Chamado com o lock adquirido
+        context, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(context['user_id'])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[context['user_id']]
@@ -0,0 +1,340 @@
+"""Histórico de chat: journal append-only (JSONL) + um arquivo por usuário, carregado sob demanda
+
+Cada mensagem grava só uma linha no journal, em vez de reescrever o
+histórico de todos os usuários. Na inicialização só o journal é lido (ele
+é limitado pela compactação); o histórico de cada usuário fica em seu
+próprio arquivo e só é lido quando o usuário conversa, indo para um LRU
+limitado de conversas ativas. Em segundo plano, a compactação grava nos
+arquivos dos usuários o que está no journal. Em disco as mensagens usam o
+formato compacto de message_format; arquivos no formato antigo continuam
+legíveis.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from message_format import FORMAT_VERSION, decode_message, dumps, encode_message, loads
+
+FSYNC_ALWAYS = 'always'      # fsync a cada gravação (mais seguro, mais lento)
+FSYNC_INTERVAL = 'interval'  # no máximo um fsync por intervalo
+FSYNC_NEVER = 'never'        # deixa o sistema operacional decidir
+
+SEQ_KEY = '__seq__'
+SEQ_FILE = 'seq'
+
+
+class ChatJournal:
+    """Dono do histórico de chat em disco e das conversas ativas em memória.
+
+    Cada arquivo de usuário guarda o número de sequência do último registro
+    do journal incluído nele; ao carregar o usuário, só os registros mais
+    novos que esse número são aplicados, então reaplicar o journal depois de
+    uma queda no meio da compactação não duplica mensagens. As listas de
+    mensagens nunca são alteradas no lugar, então quem as leu pode usá-las
+    sem lock.
+    """
+
+    def __init__(self, shard_dir, journal_path, legacy_snapshot=None, fsync_policy=FSYNC_INTERVAL,
+                 fsync_interval=1.0, compact_threshold=1000, max_messages=20, cache_size=1000):
+        self.shard_dir = shard_dir
+        self.journal_path = journal_path
+        self.legacy_snapshot = legacy_snapshot
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.compact_threshold = compact_threshold
+        self.max_messages = max_messages
+        self.cache_size = cache_size
+        self.seq = 0
+        self._pending = {}     # usuário -> [(seq, mensagens)] que ainda só estão no journal
+        self._compacting = {}  # idem, sendo gravados nos arquivos dos usuários
+        self._cache = OrderedDict()  # usuário -> histórico (LRU das conversas ativas)
+        self._generation = 0
+        self._records = 0
+        self._last_fsync = 0.0
+        self._compaction_running = False
+        self._lock = threading.Lock()
+        self._file = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self):
+        """Lê o journal (não os históricos) e abre o journal para gravação"""
+        os.makedirs(self.shard_dir, exist_ok=True)
+        if self.legacy_snapshot and os.path.exists(self.legacy_snapshot):
+            self._migrate_snapshot()
+        self.seq = self._read_seq()
+        for path in (self.journal_path + '.old', self.journal_path):
+            self._replay(path)
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+        return self
+
+    def get(self, user_id):
+        """Histórico do usuário (lido do disco na primeira vez e mantido no LRU)"""
+        with self._lock:
+            history = self._cache.get(user_id)
+            if history is not None:
+                self._cache.move_to_end(user_id)
+                self.hits += 1
+                return history
+            self.misses += 1
+
+        while True:
+            with self._lock:
+                generation = self._generation
+            shard_seq, messages = self._read_shard(user_id)
+            with self._lock:
+                history = self._cache.get(user_id)
+                if history is not None:
+                    return history
+                # Uma compactação terminou durante a leitura: o arquivo lido pode estar velho
+                if generation != self._generation:
+                    continue
+                history = self._merge(user_id, shard_seq, messages)
+                self._store(user_id, history)
+                return history
+
+    def append(self, user_id, messages):
+        """Acrescenta mensagens ao histórico do usuário (uma linha no journal)"""
+        self.write_batch([{'op': 'append', 'user': user_id, 'messages': messages}])
+
+    def create(self, user_id):
+        """Cria o histórico vazio de um novo usuário"""
+        self.write_batch([{'op': 'create', 'user': user_id}])
+
+    def write_batch(self, records):
+        """Grava vários registros ('append' ou 'create') com um único flush/fsync"""
+        with self._lock:
+            for record in records:
+                user_id = record['user']
+                if record['op'] == 'create':
+                    # Usuário novo: histórico vazio, nada a gravar
+                    if user_id not in self._cache:
+                        self._store(user_id, [])
+                    continue
+                self._write(record)
+                self._pending.setdefault(user_id, []).append((record['seq'], record['messages']))
+                cached = self._cache.get(user_id)
+                if cached is not None:
+                    # Nova lista (em vez de alterar no lugar) para não afetar leitores
+                    self._cache[user_id] = (cached + record['messages'])[-self.max_messages:]
+            self._flush()
+        self._maybe_compact()
+
+    def iter_histories(self):
+        """Percorre o histórico de todos os usuários (usado na migração para o SQLite)"""
+        seen = set()
+        for path in self.shard_paths():
+            user_id, shard_seq, messages = read_shard_file(path)
+            seen.add(user_id)
+            with self._lock:
+                history = self._merge(user_id, shard_seq, messages)
+            yield user_id, history
+        with self._lock:
+            remaining = [user_id for user_id in set(self._pending) | set(self._compacting) if user_id not in seen]
+        for user_id in remaining:
+            with self._lock:
+                history = self._merge(user_id, 0, [])
+            yield user_id, history
+
+    def shard_paths(self):
+        """Caminhos de todos os arquivos de usuário"""
+        for root, _, files in os.walk(self.shard_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    yield os.path.join(root, name)
+
+    def compact(self):
+        """Grava nos arquivos dos usuários o que está no journal e descarta o journal"""
+        with self._lock:
+            # Rotacionar o journal: tudo até `seq` fica no .old e passa para os arquivos dos usuários
+            self._flush(force=True)
+            self._file.close()
+            old_path = self.journal_path + '.old'
+            if os.path.exists(old_path):
+                # Uma compactação anterior falhou: juntar ao .old em vez de sobrescrevê-lo
+                with open(self.journal_path, 'r', encoding='utf-8') as src, open(old_path, 'a', encoding='utf-8') as dst:
+                    dst.write(src.read())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, old_path)
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+            for user_id, entries in self._pending.items():
+                self._compacting.setdefault(user_id, []).extend(entries)
+            self._pending = {}
+            compacting = {user_id: list(entries) for user_id, entries in self._compacting.items()}
+            seq = self.seq
+            self._records = 0
+
+        for user_id, entries in compacting.items():
+            shard_seq, messages = self._read_shard(user_id)
+            for entry_seq, entry_messages in entries:
+                if entry_seq > shard_seq:
+                    messages = messages + entry_messages
+            self._write_shard(user_id, max(shard_seq, entries[-1][0]), messages[-self.max_messages:])
+        self._write_seq(seq)
+
+        with self._lock:
+            self._compacting = {}
+            self._generation += 1
+        os.remove(self.journal_path + '.old')
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush(force=True)
+                self._file.close()
+                self._file = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'seq': self.seq,
+                'journal_records': self._records,
+                'fsync_policy': self.fsync_policy,
+                'cached_users': len(self._cache),
+                'cache_size': self.cache_size,
+                'cache_hits': self.hits,
+                'cache_misses': self.misses,
+                'cache_evictions': self.evictions,
+                'pending_users': len(self._pending) + len(self._compacting)
+            }
+
+    def _shard_path(self, user_id):
+        # Nome pelo hash do id: seguro para qualquer id e distribuído em 256 diretórios
+        digest = hashlib.sha1(str(user_id).encode('utf-8')).hexdigest()
+        return os.path.join(self.shard_dir, digest[:2], digest + '.json')
+
+    def _read_shard(self, user_id):
+        try:
+            _, shard_seq, messages = read_shard_file(self._shard_path(user_id))
+        except FileNotFoundError:
+            return 0, []
+        return shard_seq, messages
+
+    def _write_shard(self, user_id, seq, messages, durable=True):
+        write_shard_file(self._shard_path(user_id), user_id, seq, messages, durable=durable)
+
+    def _read_seq(self):
+        try:
+            with open(os.path.join(self.shard_dir, SEQ_FILE), 'r') as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_seq(self, seq):
+        path = os.path.join(self.shard_dir, SEQ_FILE)
+        with open(path + '.tmp', 'w') as f:
+            f.write(str(seq))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def _migrate_snapshot(self):
+        # Snapshot antigo com o histórico de todos os usuários: dividir uma única vez em arquivos por usuário
+        try:
+            with open(self.legacy_snapshot, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return  # outro processo já migrou
+        seq = data.pop(SEQ_KEY, 0)
+        for user_id, history in data.items():
+            self._write_shard(user_id, seq, [decode_message(m) for m in history[-self.max_messages:]], durable=False)
+        if hasattr(os, 'sync'):
+            os.sync()
+        self._write_seq(max(seq, self._read_seq()))
+        try:
+            os.replace(self.legacy_snapshot, self.legacy_snapshot + '.migrated')
+        except FileNotFoundError:
+            pass
+        print(f"✅ Histórico de {len(data)} usuário(s) dividido em arquivos por usuário")
+
+    def _replay(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Última linha incompleta (queda no meio da gravação)
+                    break
+                self.seq = max(self.seq, record['seq'])
+                self._records += 1
+                if record['op'] == 'append':
+                    messages = [decode_message(m) for m in record['messages']]
+                    self._pending.setdefault(record['user'], []).append((record['seq'], messages))
+
+    def _merge(self, user_id, shard_seq, messages):
+        # Chamado com o lock adquirido: aplica os registros do journal mais novos que o arquivo
+        for entry_seq, entry_messages in self._compacting.get(user_id, []) + self._pending.get(user_id, []):
+            if entry_seq > shard_seq:
+                messages = messages + entry_messages
+        return messages[-self.max_messages:]
+
+    def _store(self, user_id, history):
+        # Chamado com o lock adquirido
+        self._cache[user_id] = history
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            # Tudo já está no journal ou no arquivo do usuário: basta soltar da memória
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def _write(self, record):
+        # Chamado com o lock adquirido
+        self.seq += 1
+        record['seq'] = self.seq
+        line = dict(record, messages=[encode_message(m) for m in record['messages']])
+        self._file.write(json.dumps(line, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._records += 1
+
+    def _flush(self, force=False):
+        self._file.flush()
+        if self.fsync_policy == FSYNC_NEVER and not force:
+            return
+        now = time.monotonic()
+        if force or self.fsync_policy == FSYNC_ALWAYS or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def _maybe_compact(self):
+        with self._lock:
+            if self._compaction_running or self._records < self.compact_threshold:
+                return
+            self._compaction_running = True
+
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Erro ao compactar histórico: {e}")
+            finally:
+                with self._lock:
+                    self._compaction_running = False
+
+        threading.Thread(target=run, name='chat-journal-compact', daemon=True).start()
+
+
+def read_shard_file(path):
+    """Lê um arquivo de usuário (qualquer versão, comprimido ou não); retorna (usuário, seq, mensagens)"""
+    with open(path, 'rb') as f:
+        shard = loads(f.read())
+    return shard['user'], shard['seq'], [decode_message(m) for m in shard['messages']]
+
+
+def write_shard_file(path, user_id, seq, messages, durable=True, compression=None):
+    """Grava um arquivo de usuário no formato atual, de forma atômica (arquivo temporário + rename)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    data = dumps({'v': FORMAT_VERSION, 'user': user_id, 'seq': seq,
+                  'messages': [encode_message(m) for m in messages]}, compression)
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,190 @@
+"""Cache de contexto do Gemini (cachedContents) para o prompt do sistema
+
+O prompt do sistema é o mesmo em toda conversa. Em vez de mandá-lo em cada
+generateContent, ele fica guardado no Gemini e a requisição só referencia o
+cache. Cada chave tem o seu (o cache pertence ao projeto da chave) e cada
+modelo também. O cache é criado em segundo plano na primeira vez que a
+chave/modelo é usado e o TTL é renovado enquanto houver conversas; sem uso,
+ele vence sozinho no Gemini.
+
+Se o Gemini recusar o cache (ex.: prompt abaixo do mínimo de tokens ou
+modelo sem suporte), a chave/modelo continua mandando o systemInstruction
+e só tenta de novo depois de `retry_after` segundos.
+"""
+import threading
+import time
+from collections import deque
+
+import gemini_client
+from prompt_builder import percentile
+
+
+class ContextCache:
+    """Nomes dos caches por (chave, modelo), com as métricas com e sem cache.
+
+    `get` nunca espera a rede: sem cache pronto, retorna None e a chamada
+    segue com o systemInstruction completo.
+    """
+
+    def __init__(self, http, system_prompt, ttl=3600, refresh_margin=600, retry_after=3600, timeout=10,
+                 enabled=True, window=200):
+        self.http = http
+        self.system_prompt = system_prompt
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl / 2)
+        self.retry_after = retry_after
+        self.timeout = timeout
+        self.enabled = enabled
+        self._entries = {}  # (api_key, modelo) -> {'name', 'expires_at', 'refresh_at'}
+        self._unavailable = {}  # (api_key, modelo) -> quando tentar criar de novo
+        self._pending = set()
+        self._lock = threading.Lock()
+        # Amostras com e sem cache: latência (primeiro token do stream ou resposta inteira) e tokens de entrada
+        self._latency = {(cached, stream): deque(maxlen=window) for cached in (True, False) for stream in (True, False)}
+        self._input_tokens = {True: deque(maxlen=window), False: deque(maxlen=window)}
+        self._cached_tokens = deque(maxlen=window)
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.refreshed = 0
+        self.create_errors = 0
+        self.invalidations = 0
+
+    def get(self, api_key, model):
+        """Nome do cache da chave/modelo (None se não houver um pronto; a criação começa em segundo plano)"""
+        if not self.enabled:
+            return None
+        key = (api_key, model)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now < entry['expires_at']:
+                self.hits += 1
+                if now >= entry['refresh_at']:
+                    self._schedule(key, self._refresh, entry['name'])
+                return entry['name']
+            self._entries.pop(key, None)
+            self.misses += 1
+            if now >= self._unavailable.get(key, 0):
+                self._schedule(key, self._create)
+        return None
+
+    def invalidate(self, api_key, model, disable=False):
+        """Esquece o cache que o Gemini recusou; com `disable`, não cria outro por `retry_after` segundos"""
+        key = (api_key, model)
+        with self._lock:
+            self._entries.pop(key, None)
+            self.invalidations += 1
+            if disable:
+                self._unavailable[key] = time.monotonic() + self.retry_after
+
+    def record_latency(self, seconds, cached, stream=False):
+        """Tempo até o primeiro token (`stream`) ou até a resposta inteira"""
+        with self._lock:
+            self._latency[(cached, stream)].append(seconds)
+
+    def record_usage(self, usage, cached):
+        """Tokens de entrada cobrados integralmente (sem os que vieram do cache)"""
+        tokens = usage.get('promptTokenCount')
+        if tokens is None:
+            return
+        cached_tokens = usage.get('cachedContentTokenCount') or 0
+        with self._lock:
+            self._input_tokens[cached].append(tokens - cached_tokens)
+            if cached:
+                self._cached_tokens.append(cached_tokens)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            def ms(samples, fraction):
+                return round(percentile(samples, fraction) * 1000) if samples else None
+
+            def mode(cached):
+                first_token = sorted(self._latency[(cached, True)])
+                response = sorted(self._latency[(cached, False)])
+                tokens = sorted(self._input_tokens[cached])
+                return {
+                    'requests': len(first_token) + len(response),
+                    'first_token_ms_p50': ms(first_token, 0.5),
+                    'first_token_ms_p95': ms(first_token, 0.95),
+                    'response_ms_p50': ms(response, 0.5),
+                    'response_ms_p95': ms(response, 0.95),
+                    'input_tokens_p50': percentile(tokens, 0.5),
+                    'input_tokens_p95': percentile(tokens, 0.95)
+                }
+
+            return {
+                'enabled': self.enabled,
+                'caches': len(self._entries),
+                'unavailable': sum(1 for retry_at in self._unavailable.values() if now < retry_at),
+                'hits': self.hits,
+                'misses': self.misses,
+                'created': self.created,
+                'refreshed': self.refreshed,
+                'create_errors': self.create_errors,
+                'invalidations': self.invalidations,
+                'cached_tokens_p50': percentile(sorted(self._cached_tokens), 0.5),
+                'with_cache': mode(True),
+                'without_cache': mode(False)
+            }
+
+    def _create(self, key):
+        api_key, model = key
+        started = time.monotonic()
+        try:
+            name = gemini_client.create_cached_content(self.http, api_key, model, self.system_prompt, self.ttl,
+                                                       timeout=self.timeout)
+        except Exception as e:
+            with self._lock:
+                self.create_errors += 1
+                self._unavailable[key] = time.monotonic() + self.retry_after
+            print(f"⚠️ Cache de contexto indisponível para {model}: {e}")
+            return
+        with self._lock:
+            self._entries[key] = self._entry(name, started)
+            self._unavailable.pop(key, None)
+            self.created += 1
+
+    def _refresh(self, key, name):
+        api_key, model = key
+        started = time.monotonic()
+        try:
+            gemini_client.update_cached_content_ttl(self.http, api_key, name, self.ttl, timeout=self.timeout)
+        except Exception as e:
+            print(f"Erro ao renovar cache de contexto ({model}): {e}")
+            response = getattr(e, 'response', None)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and entry['name'] == name:
+                    if response is not None and response.status_code in (403, 404):
+                        # O cache já não existe no Gemini: o próximo uso cria outro
+                        del self._entries[key]
+                    else:
+                        # Tentar de novo daqui a pouco, enquanto o cache não vence
+                        entry['refresh_at'] = time.monotonic() + min(60, self.refresh_margin / 2)
+            return
+        with self._lock:
+            if key in self._entries and self._entries[key]['name'] == name:
+                self._entries[key] = self._entry(name, started)
+                self.refreshed += 1
+
+    def _entry(self, name, started):
+        # O prazo conta do envio da requisição, para não passar do vencimento real no Gemini
+        expires_at = started + self.ttl
+        return {'name': name, 'expires_at': expires_at, 'refresh_at': expires_at - self.refresh_margin}
+
+    def _schedule(self, key, target, *args):
+        # Chamado com o lock adquirido; uma criação/renovação por vez para cada chave/modelo
+        if key in self._pending:
+            return
+        self._pending.add(key)
+
+        def run():
+            try:
+                target(key, *args)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        threading.Thread(target=run, name='context-cache', daemon=True).start()
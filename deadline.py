@@ -0,0 +1,33 @@
+"""Prazo total de uma requisição, dividido entre as etapas que ela executa"""
+import time
+
+
+class DeadlineExceeded(Exception):
+    """O prazo da requisição acabou"""
+
+
+class Deadline:
+    """Prazo absoluto de uma requisição.
+
+    Cada etapa pede seu timeout com `timeout(cap, share)`: no máximo `cap`
+    segundos e no máximo a fração `share` do tempo que ainda resta, para
+    sobrar prazo para as etapas seguintes.
+    """
+
+    def __init__(self, seconds, min_step=0.5):
+        self.seconds = seconds
+        self.min_step = min_step
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() < self.min_step
+
+    def timeout(self, cap, share=1.0):
+        """Timeout da próxima etapa; levanta DeadlineExceeded se não houver tempo útil"""
+        remaining = self.remaining()
+        if remaining < self.min_step:
+            raise DeadlineExceeded(f"Prazo de {self.seconds:.1f}s esgotado")
+        return max(self.min_step, min(cap, remaining * share))
@@ -0,0 +1,104 @@
+"""Chamadas REST à API do Gemini"""
+import json
+
+GEMINI_API_BASE = 'https://generativelanguage.googleapis.com'
+
+
+def model_url(api_version, model, method, api_key, **params):
+    """Monta a URL de um método do modelo (ex: generateContent)"""
+    query = ''.join(f'&{name}={value}' for name, value in params.items())
+    return f"{GEMINI_API_BASE}/{api_version}/models/{model}:{method}?key={api_key}{query}"
+
+
+def content(role, text):
+    """Um turno da conversa ('user' ou 'model')"""
+    return {"role": role, "parts": [{"text": text}]}
+
+
+def system_instruction(system_prompt):
+    return {"parts": [{"text": system_prompt}]}
+
+
+def chat_payload(system_prompt, contents):
+    """Corpo da requisição: prompt do sistema em systemInstruction e a conversa em turnos"""
+    return {
+        "systemInstruction": system_instruction(system_prompt),
+        "contents": contents
+    }
+
+
+def with_cached_content(payload, name):
+    """Troca o systemInstruction do payload pela referência ao cache de contexto (só na v1beta)"""
+    cached = {key: value for key, value in payload.items() if key != 'systemInstruction'}
+    cached['cachedContent'] = name
+    return cached
+
+
+def create_cached_content(http, api_key, model, system_prompt, ttl, timeout=10):
+    """Guarda o prompt do sistema no Gemini (cachedContents) e retorna o nome do cache"""
+    url = f"{GEMINI_API_BASE}/v1beta/cachedContents?key={api_key}"
+    result = http.post_json(url, {
+        "model": f"models/{model}",
+        "systemInstruction": system_instruction(system_prompt),
+        "ttl": f"{ttl}s"
+    }, timeout=timeout)
+    return result['name']
+
+
+def update_cached_content_ttl(http, api_key, name, ttl, timeout=10):
+    """Renova o TTL de um cache de contexto"""
+    url = f"{GEMINI_API_BASE}/v1beta/{name}?key={api_key}&updateMask=ttl"
+    response = http.request('PATCH', url, timeout=timeout, json={"ttl": f"{ttl}s"})
+    response.raise_for_status()
+
+
+def extract_text(result):
+    """Extrai o texto do primeiro candidato de uma resposta do Gemini"""
+    candidates = result.get('candidates') or []
+    if not candidates:
+        return None
+    parts = candidates[0].get('content', {}).get('parts') or []
+    return ''.join(part.get('text', '') for part in parts) or None
+
+
+def generate(http, api_version, model, api_key, payload, timeout=30, on_usage=None):
+    """Chama generateContent e retorna o texto da resposta; `on_usage` recebe o usageMetadata"""
+    result = http.post_json(model_url(api_version, model, 'generateContent', api_key), payload, timeout=timeout)
+    if on_usage is not None and result.get('usageMetadata'):
+        on_usage(result['usageMetadata'])
+    return extract_text(result)
+
+
+def open_stream(http, api_version, model, api_key, payload, timeout=30):
+    """Abre uma chamada streamGenerateContent (SSE) e retorna a resposta HTTP aberta.
+
+    Quem chama é responsável por fechar a resposta; fechá-la antes do fim
+    cancela a requisição no Gemini.
+    """
+    url = model_url(api_version, model, 'streamGenerateContent', api_key, alt='sse')
+    response = http.request('POST', url, timeout=timeout, json=payload, stream=True)
+    try:
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+    response.encoding = 'utf-8'
+    return response
+
+
+def iter_stream_text(response, on_usage=None):
+    """Itera sobre os trechos de texto recebidos de um stream SSE do Gemini.
+
+    `on_usage` recebe o usageMetadata do último trecho, quando o stream termina.
+    """
+    usage = None
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith('data:'):
+            continue
+        chunk = json.loads(line[len('data:'):])
+        usage = chunk.get('usageMetadata') or usage
+        text = extract_text(chunk)
+        if text:
+            yield text
+    if on_usage is not None and usage:
+        on_usage(usage)
@@ -0,0 +1,150 @@
+"""Verificação local dos ID tokens do Google com os certificados em cache"""
+import re
+import threading
+import time
+
+from google.auth import exceptions as google_exceptions
+from google.auth import jwt as google_jwt
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+
+def cache_max_age(headers, default):
+    """Segundos de validade da resposta pelo Cache-Control: max-age (descontando o Age)"""
+    match = re.search(r'max-age=(\d+)', headers.get('Cache-Control', ''))
+    if not match:
+        return default
+    return max(int(match.group(1)) - int(headers.get('Age') or 0), 0)
+
+
+class GoogleTokenVerifier:
+    """Substitui id_token.verify_oauth2_token sem buscar os certificados a cada login.
+
+    Os certificados ficam em memória pelo max-age que o Google devolve. Perto
+    do vencimento uma thread busca a lista nova enquanto a atual continua em
+    uso. Um token assinado por uma chave que ainda não conhecemos (rotação)
+    força uma busca imediata, no máximo uma vez a cada `min_refetch_interval`
+    segundos.
+    """
+
+    def __init__(self, http, certs_url=GOOGLE_CERTS_URL, default_ttl=3600, refresh_margin=300, timeout=10,
+                 min_refetch_interval=60):
+        self.http = http
+        self.certs_url = certs_url
+        self.default_ttl = default_ttl
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.min_refetch_interval = min_refetch_interval
+        self._certs = None
+        self._fetched_at = None
+        self._refresh_at = 0
+        self._expires_at = 0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.refreshes = 0
+        self.fetch_errors = 0
+
+    def verify(self, token, audience, clock_skew_in_seconds=0):
+        """Valida assinatura, audiência, validade e emissor; retorna os dados do token"""
+        try:
+            idinfo = google_jwt.decode(token, certs=self.certs(), audience=audience,
+                                       clock_skew_in_seconds=clock_skew_in_seconds)
+        except ValueError as e:
+            if 'Certificate for key id' not in str(e):
+                raise
+            # Chave nova do Google: buscar a lista de novo e tentar mais uma vez
+            idinfo = google_jwt.decode(token, certs=self._fetch(unknown_key=True), audience=audience,
+                                       clock_skew_in_seconds=clock_skew_in_seconds)
+        if idinfo['iss'] not in GOOGLE_ISSUERS:
+            raise google_exceptions.GoogleAuthError(
+                f"Wrong issuer. 'iss' should be one of the following: {list(GOOGLE_ISSUERS)}"
+            )
+        return idinfo
+
+    def certs(self):
+        """Certificados atuais ({key id: certificado}), buscando só se vencidos"""
+        now = time.monotonic()
+        with self._lock:
+            if self._certs is not None and now < self._expires_at:
+                self.hits += 1
+                if now >= self._refresh_at:
+                    self._schedule_refresh()
+                return self._certs
+            self.misses += 1
+        return self._fetch()
+
+    def warm(self):
+        """Busca os certificados em segundo plano (ex.: na inicialização)"""
+        def run():
+            try:
+                self._fetch()
+            except Exception as e:
+                print(f"Erro ao pré-carregar certificados do Google: {e}")
+
+        thread = threading.Thread(target=run, name='google-certs-warm', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._certs) if self._certs is not None else 0,
+                'expires_in': round(self._expires_at - time.monotonic()) if self._certs is not None else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'fetches': self.fetches,
+                'refreshes': self.refreshes,
+                'fetch_errors': self.fetch_errors
+            }
+
+    def _fetch(self, refresh=False, unknown_key=False):
+        # Uma busca por vez; quem esperou usa o resultado da busca que terminou
+        with self._fetch_lock:
+            now = time.monotonic()
+            with self._lock:
+                if self._certs is not None:
+                    if unknown_key:
+                        if now - self._fetched_at < self.min_refetch_interval:
+                            return self._certs
+                    elif now < (self._refresh_at if refresh else self._expires_at):
+                        return self._certs
+            try:
+                response = self.http.request('GET', self.certs_url, timeout=self.timeout)
+                response.raise_for_status()
+                certs = response.json()
+            except Exception:
+                with self._lock:
+                    self.fetch_errors += 1
+                raise
+            ttl = cache_max_age(response.headers, self.default_ttl)
+            with self._lock:
+                self._certs = certs
+                self._fetched_at = now
+                self._expires_at = now + ttl
+                # Atualizar `refresh_margin` segundos antes de vencer (ou na metade, se o max-age for curto)
+                self._refresh_at = now + max(ttl - self.refresh_margin, ttl / 2)
+                self.fetches += 1
+            return certs
+
+    def _schedule_refresh(self):
+        # Chamado com o lock adquirido
+        if self._refreshing:
+            return
+        self._refreshing = True
+        self.refreshes += 1
+
+        def run():
+            try:
+                self._fetch(refresh=True)
+            except Exception as e:
+                print(f"Erro ao atualizar certificados do Google: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name='google-certs-refresh', daemon=True).start()
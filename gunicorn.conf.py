@@ -0,0 +1,38 @@
+"""Configuração do Gunicorn (carregada automaticamente por `gunicorn app:app`)
+
+Por padrão os workers são assíncronos (gevent): cada chamada ao Gemini ou ao
+Google OAuth cede o processo enquanto espera a rede, então um único worker
+atende centenas de conversas simultâneas sem travar rotas rápidas como
+/api/auth/verify. Use GUNICORN_WORKER_CLASS=sync para o modo antigo.
+"""
+import os
+import sys
+
+try:
+    import gevent  # noqa: F401
+    _default_worker_class = 'gevent'
+except ImportError:
+    _default_worker_class = 'sync'
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', _default_worker_class)
+# Conexões simultâneas por worker assíncrono
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+if workers > 1:
+    # Cada worker é um processo: usuários e histórico precisam ficar no SQLite, compartilhado entre eles
+    os.environ.setdefault('STORAGE_BACKEND', 'sqlite')
+if worker_class == 'gevent':
+    # Pool HTTP maior para acompanhar as chamadas simultâneas ao Gemini
+    os.environ.setdefault('HTTP_POOL_SIZE', '100')
+# As respostas do Gemini podem demorar; o worker assíncrono continua respondendo ao heartbeat
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+
+def worker_exit(server, worker):
+    """Grava os dados pendentes (histórico e usuários) antes de o worker encerrar"""
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.storage.close()
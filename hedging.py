@@ -0,0 +1,136 @@
+"""Requisições "hedged": duplica a chamada lenta em outra chave e fica com a primeira resposta"""
+import queue
+import threading
+import time
+from collections import deque
+
+from http_pool import CancelScope
+
+
+class Hedger:
+    """Dispara uma segunda tentativa quando a primeira passa do percentil de latência.
+
+    O atraso do hedge é o percentil `percentile` das últimas latências de
+    sucesso (nunca menor que `min_delay`). Para limitar o gasto extra, o
+    número de hedges nunca passa de `max_ratio` vezes o número de chamadas
+    principais. A tentativa perdedora é cancelada.
+    """
+
+    def __init__(self, percentile=95, min_delay=2.0, max_ratio=0.1, window=200):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.primaries = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.budget_denied = 0
+        self.cancelled = 0
+
+    def delay(self):
+        """Tempo de espera pela tentativa principal antes de disparar o hedge"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return self.min_delay
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return max(self.min_delay, samples[index])
+
+    def run(self, attempt, first_key, next_key, release_key, deadline=None):
+        """Executa attempt(key) com hedge; retorna (chave, texto, erros).
+
+        next_key() reserva outra chave para o hedge (ou retorna None) e
+        release_key(key, error, cancelled) devolve cada chave ao pool. Se o
+        prazo acabar, todas as tentativas são canceladas.
+        """
+        results = queue.Queue()
+        scopes = []
+
+        def worker(key, is_hedge, scope):
+            started = time.monotonic()
+            text, error = None, None
+            with scope:
+                try:
+                    text = attempt(key)
+                    if not text:
+                        raise Exception("Resposta vazia do Gemini")
+                except Exception as e:
+                    error = e
+            release_key(key, None if scope.cancelled else error, scope.cancelled)
+            results.put((key, is_hedge, scope, text, error, time.monotonic() - started))
+
+        def start(key, is_hedge):
+            scope = CancelScope()
+            scopes.append(scope)
+            threading.Thread(target=worker, args=(key, is_hedge, scope), daemon=True).start()
+
+        with self._lock:
+            self.primaries += 1
+        start(first_key, False)
+        pending = 1
+        timeout = self.delay()
+        errors = []
+
+        while pending:
+            wait = timeout
+            if deadline is not None:
+                wait = deadline.remaining() if wait is None else min(wait, deadline.remaining())
+            try:
+                key, is_hedge, winner_scope, text, error, elapsed = results.get(timeout=wait)
+            except queue.Empty:
+                if deadline is not None and deadline.expired():
+                    for scope in scopes:
+                        scope.cancel()
+                    with self._lock:
+                        self.cancelled += pending
+                    break
+                if timeout is None:
+                    continue
+                # Tentativa principal lenta: disparar o hedge (uma vez só)
+                timeout = None
+                hedge_key = next_key() if self._has_budget() else None
+                if hedge_key is not None:
+                    with self._lock:
+                        self.hedges_fired += 1
+                    start(hedge_key, True)
+                    pending += 1
+                continue
+
+            pending -= 1
+            if text:
+                for scope in scopes:
+                    if scope is not winner_scope:
+                        scope.cancel()
+                with self._lock:
+                    self._latencies.append(elapsed)
+                    self.cancelled += pending
+                    if is_hedge:
+                        self.hedge_wins += 1
+                    else:
+                        self.primary_wins += 1
+                return key, text, errors
+            errors.append((key, error))
+
+        return None, None, errors
+
+    def stats(self):
+        delay = self.delay()
+        with self._lock:
+            return {
+                'primaries': self.primaries,
+                'hedges_fired': self.hedges_fired,
+                'hedge_wins': self.hedge_wins,
+                'primary_wins': self.primary_wins,
+                'budget_denied': self.budget_denied,
+                'cancelled': self.cancelled,
+                'delay': round(delay, 3)
+            }
+
+    def _has_budget(self):
+        with self._lock:
+            if self.hedges_fired >= self.max_ratio * self.primaries:
+                self.budget_denied += 1
+                return False
+            return True
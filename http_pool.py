@@ -0,0 +1,174 @@
+"""Cliente HTTP com pool de conexões keep-alive para as APIs do Google"""
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+GEMINI_HOST = 'generativelanguage.googleapis.com'
+OAUTH_HOST = 'oauth2.googleapis.com'
+
+
+_local = threading.local()
+
+
+class RequestCancelled(Exception):
+    """A requisição foi cancelada por outra thread"""
+
+
+class CancelScope:
+    """Permite cancelar, a partir de outra thread, as requisições feitas dentro do bloco.
+
+    As conexões usadas dentro do `with` ficam registradas; `cancel()` derruba
+    o socket delas, o que interrompe a leitura bloqueada na thread dona.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._conns = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        _local.scope = self
+        return self
+
+    def __exit__(self, *exc):
+        _local.scope = None
+        return False
+
+    def register(self, conn):
+        with self._lock:
+            if self.cancelled:
+                raise RequestCancelled()
+            self._conns.add(conn)
+            conn._cancel_scope = self
+
+    def unregister(self, conn):
+        with self._lock:
+            self._conns.discard(conn)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            conns = list(self._conns)
+        for conn in conns:
+            sock = getattr(conn, 'sock', None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+class PoolStats:
+    """Contadores de reaproveitamento de conexões por host"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def record(self, host, reused):
+        with self._lock:
+            counters = self._hosts.setdefault(host, {'requests': 0, 'hits': 0, 'misses': 0})
+            counters['requests'] += 1
+            counters['hits' if reused else 'misses'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {host: dict(counters) for host, counters in self._hosts.items()}
+
+
+def _counting_pool(base, stats, keepalive):
+    """Cria uma classe de pool que conta conexões reaproveitadas e descarta as ociosas"""
+
+    class CountingPool(base):
+        def _get_conn(self, timeout=None):
+            conn = super()._get_conn(timeout=timeout)
+            last_used = getattr(conn, '_last_used', None)
+            if conn.sock is not None and last_used is not None and time.monotonic() - last_used > keepalive:
+                # Conexão ociosa há mais tempo que o keep-alive: reconectar
+                conn.close()
+            stats.record(self.host, reused=conn.sock is not None)
+            scope = getattr(_local, 'scope', None)
+            if scope is not None:
+                try:
+                    scope.register(conn)
+                except RequestCancelled:
+                    super()._put_conn(conn)
+                    raise
+            return conn
+
+        def _put_conn(self, conn):
+            if conn is not None:
+                conn._last_used = time.monotonic()
+                scope = getattr(conn, '_cancel_scope', None)
+                if scope is not None:
+                    scope.unregister(conn)
+                    conn._cancel_scope = None
+            super()._put_conn(conn)
+
+    return CountingPool
+
+
+class PooledAdapter(HTTPAdapter):
+    """Adapter do requests com pool contabilizado e keep-alive configurável"""
+
+    def __init__(self, stats, pool_size=10, keepalive=60):
+        self._stats = stats
+        self._keepalive = keepalive
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool(HTTPConnectionPool, self._stats, self._keepalive),
+            'https': _counting_pool(HTTPSConnectionPool, self._stats, self._keepalive)
+        }
+
+
+class HttpClient:
+    """Sessão HTTP compartilhada entre threads para Gemini e Google OAuth.
+
+    Cada host tem seu próprio pool de conexões (tamanho e keep-alive
+    configuráveis) e cada chamada pode definir seu próprio timeout.
+    """
+
+    def __init__(self, pool_size=10, keepalive=60, connect_timeout=5, read_timeout=30,
+                 hosts=(GEMINI_HOST, OAUTH_HOST)):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._stats = PoolStats()
+        self.session = requests.Session()
+        # Adapter padrão para os demais hosts (ex: certificados do Google)
+        self.session.mount('https://', PooledAdapter(self._stats, pool_size, keepalive))
+        for host in hosts:
+            self.session.mount(f'https://{host}', PooledAdapter(self._stats, pool_size, keepalive))
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """Faz a requisição usando o pool; timeout é o tempo máximo de leitura"""
+        read_timeout = timeout if timeout is not None else self.read_timeout
+        return self.session.request(method, url, timeout=(self.connect_timeout, read_timeout), **kwargs)
+
+    def get_json(self, url, timeout=None):
+        response = self.request('GET', url, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def post_json(self, url, payload, timeout=None):
+        response = self.request('POST', url, timeout=timeout, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def post(self, url, timeout=None, **kwargs):
+        return self.request('POST', url, timeout=timeout, **kwargs)
+
+    def stats(self):
+        return self._stats.snapshot()
+
+
+def status_code(error):
+    """Retorna o status HTTP de um erro do requests (ou None)"""
+    response = getattr(error, 'response', None)
+    return response.status_code if response is not None else None
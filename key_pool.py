@@ -0,0 +1,125 @@
+"""Pool de chaves da API Gemini com estado de saúde por chave"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from retry_policy import AUTH, CANCELLED, RATE_LIMITED, classify, parse_retry_after
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+except Exception:
+    QUOTA_TIMEZONE = None
+
+
+def seconds_until_quota_reset(now=None):
+    """Segundos até a meia-noite do Pacífico, quando a cota diária do Gemini é renovada"""
+    if QUOTA_TIMEZONE is None:
+        return 3600
+    now = now or datetime.now(QUOTA_TIMEZONE)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(60, (midnight - now).total_seconds())
+
+
+class KeyState:
+    """Estado de saúde de uma chave"""
+
+    def __init__(self, key):
+        self.key = key
+        self.in_flight = 0
+        self.uses = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_used = 0.0
+        self.last_failure = 0.0
+        self.open_until = 0.0
+        self.last_status = None
+
+
+class KeyPool:
+    """Escolhe a chave de cada requisição e abre o circuito das chaves com falha.
+
+    A chave escolhida é a disponível com menos requisições em andamento,
+    menos falhas seguidas e uso mais antigo, o que distribui a carga entre
+    todas as chaves. Depois de um 429/403 a chave fica fora do rodízio até o
+    fim do cooldown (ou até a renovação da cota diária); erros transitórios só
+    abrem o circuito depois de `failure_threshold` falhas seguidas.
+    """
+
+    def __init__(self, keys, cooldown=60, max_cooldown=3600, failure_threshold=3):
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failure_threshold = failure_threshold
+        self._states = {key: KeyState(key) for key in keys}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._states)
+
+    def acquire(self, exclude=()):
+        """Reserva a melhor chave disponível (ou None se todas estiverem em cooldown)"""
+        now = time.monotonic()
+        with self._lock:
+            available = [s for s in self._states.values() if s.key not in exclude and s.open_until <= now]
+            if not available:
+                return None
+            state = min(available, key=lambda s: (s.in_flight, s.consecutive_failures, s.last_used))
+            state.in_flight += 1
+            state.uses += 1
+            state.last_used = now
+            return state.key
+
+    def release(self, key, error=None, cancelled=False):
+        """Devolve a chave ao pool registrando o resultado da chamada"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states[key]
+            state.in_flight = max(0, state.in_flight - 1)
+            if cancelled:
+                # Chamada cancelada por nós (ex: hedge perdedor): não conta como sucesso nem falha
+                return
+            if error is None:
+                state.consecutive_failures = 0
+                state.last_status = 200
+                return
+
+            category = classify(error)
+            if category == CANCELLED:
+                return
+            response = getattr(error, 'response', None)
+            status = response.status_code if response is not None else None
+            state.failures += 1
+            state.consecutive_failures += 1
+            state.last_failure = now
+            state.last_status = status
+
+            if category == RATE_LIMITED:
+                if 'PerDay' in (response.text or ''):
+                    # Cota diária esgotada: só volta depois da renovação
+                    wait = seconds_until_quota_reset()
+                else:
+                    wait = parse_retry_after(error) or self._backoff(state)
+            elif category == AUTH:
+                # Chave inválida ou sem permissão
+                wait = self.max_cooldown
+            elif state.consecutive_failures >= self.failure_threshold:
+                wait = self._backoff(state)
+            else:
+                return
+            state.open_until = now + wait
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'key': f"...{s.key[-4:]}",
+                'in_flight': s.in_flight,
+                'uses': s.uses,
+                'failures': s.failures,
+                'consecutive_failures': s.consecutive_failures,
+                'last_status': s.last_status,
+                'cooldown_remaining': max(0, round(s.open_until - now))
+            } for s in self._states.values()]
+
+    def _backoff(self, state):
+        return min(self.max_cooldown, self.cooldown * 2 ** max(0, state.consecutive_failures - 1))
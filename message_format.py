@@ -0,0 +1,79 @@
+"""Formato compacto das mensagens do histórico em disco (versão 2)
+
+Cada mensagem é gravada como [papel, texto, timestamp], com o papel como
+inteiro (0 = user, 1 = model), em vez de {'role', 'parts': [texto], 'text'}
+com o texto duplicado. Os leitores aceitam os dois formatos. Arquivos frios
+podem ser comprimidos com gzip ou zstd (se o pacote zstandard estiver
+instalado); a compressão é reconhecida pelos primeiros bytes do arquivo.
+"""
+import gzip
+import json
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMAT_VERSION = 2
+
+ROLES = ('user', 'model')
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def new_message(role, text):
+    """Mensagem nova, no formato usado em memória"""
+    return {'role': role, 'text': text, 'ts': int(time.time())}
+
+
+def encode_message(msg):
+    """Mensagem em memória -> [papel, texto, timestamp]"""
+    text = msg.get('text')
+    if text is None:
+        text = (msg.get('parts') or [''])[0]
+    role = ROLE_CODES.get(msg.get('role'), msg.get('role'))
+    ts = msg.get('ts')
+    return [role, text] if ts is None else [role, text, ts]
+
+
+def decode_message(raw):
+    """[papel, texto, timestamp] ou o formato antigo {'role', 'parts', 'text'} -> mensagem em memória"""
+    if isinstance(raw, dict):
+        text = raw.get('text')
+        if text is None:
+            text = (raw.get('parts') or [''])[0]
+        return {'role': raw.get('role', 'user'), 'text': text, 'ts': raw.get('ts')}
+    role = raw[0]
+    return {
+        'role': ROLES[role] if isinstance(role, int) and role < len(ROLES) else role,
+        'text': raw[1],
+        'ts': raw[2] if len(raw) > 2 else None
+    }
+
+
+def dumps(obj, compression=None):
+    """Serializa em JSON compacto (bytes), opcionalmente comprimido"""
+    data = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if compression == GZIP:
+        return gzip.compress(data, compresslevel=6)
+    if compression == ZSTD:
+        if zstandard is None:
+            raise RuntimeError('Compressão zstd requer o pacote zstandard')
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return data
+
+
+def loads(data):
+    """Lê o JSON gravado por dumps, descomprimindo se necessário"""
+    if data[:2] == GZIP_MAGIC:
+        data = gzip.decompress(data)
+    elif data[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError('Arquivo comprimido com zstd: instale o pacote zstandard')
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return json.loads(data)
@@ -0,0 +1,112 @@
+"""Cache do catálogo de modelos Gemini disponíveis para cada chave de API"""
+import threading
+import time
+
+MODELS_URL = 'https://generativelanguage.googleapis.com/v1/models?key={api_key}'
+
+
+def fetch_models(http, api_key, timeout=10):
+    """Lista os modelos da chave que suportam generateContent"""
+    models_result = http.get_json(MODELS_URL.format(api_key=api_key), timeout=timeout)
+
+    available_models = []
+    for m in models_result.get('models', []):
+        # Filtrar apenas modelos que suportam generateContent
+        if 'generateContent' in m.get('supportedGenerationMethods', []):
+            # Extrair nome curto do modelo (ex: "gemini-pro" de "models/gemini-pro")
+            available_models.append(m.get('name', '').split('/')[-1])
+    return available_models
+
+
+class ModelCatalog:
+    """Catálogo de modelos por chave com TTL e atualização em segundo plano.
+
+    Dentro do TTL a consulta não faz nenhuma chamada de rede. Quando a entrada
+    se aproxima do vencimento, uma thread atualiza o catálogo enquanto a versão
+    atual continua sendo servida.
+    """
+
+    def __init__(self, http, ttl=3600, refresh_margin=300, timeout=10, fetcher=fetch_models):
+        self.http = http
+        self.ttl = ttl
+        self.refresh_margin = min(refresh_margin, ttl)
+        self.timeout = timeout
+        self.fetcher = fetcher
+        self._entries = {}  # api_key -> (modelos, carregado_em)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def get(self, api_key, timeout=None):
+        """Retorna os modelos da chave, buscando na API apenas se necessário.
+
+        `timeout` limita a busca síncrona em caso de cache miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(api_key)
+            if entry and now - entry[1] < self.ttl:
+                self.hits += 1
+                if now - entry[1] >= self.ttl - self.refresh_margin:
+                    self._schedule_refresh(api_key)
+                return list(entry[0])
+            self.misses += 1
+
+        return list(self._load(api_key, timeout))
+
+    def invalidate(self, api_key=None):
+        """Descarta o catálogo de uma chave (ou de todas)"""
+        with self._lock:
+            if api_key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(api_key, None)
+
+    def warm(self, api_keys):
+        """Carrega o catálogo de todas as chaves em segundo plano"""
+        def run():
+            for api_key in api_keys:
+                try:
+                    self._load(api_key)
+                except Exception as e:
+                    print(f"Erro ao pré-carregar modelos: {e}")
+
+        thread = threading.Thread(target=run, name='model-catalog-warm', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes
+            }
+
+    def _load(self, api_key, timeout=None):
+        timeout = self.timeout if timeout is None else min(self.timeout, timeout)
+        models = self.fetcher(self.http, api_key, timeout=timeout)
+        with self._lock:
+            self._entries[api_key] = (models, time.monotonic())
+        return models
+
+    def _schedule_refresh(self, api_key):
+        # Chamado com o lock adquirido
+        if api_key in self._refreshing:
+            return
+        self._refreshing.add(api_key)
+        self.refreshes += 1
+
+        def run():
+            try:
+                self._load(api_key)
+            except Exception as e:
+                print(f"Erro ao atualizar catálogo de modelos: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(api_key)
+
+        threading.Thread(target=run, name='model-catalog-refresh', daemon=True).start()
@@ -0,0 +1,143 @@
+"""Hash de senhas com scrypt em um pool de processos limitado
+
+O scrypt é lento de propósito (dezenas de ms de CPU por senha). Rodando
+dentro do worker, uma rajada de logins travaria as conversas (no gevent,
+o worker inteiro). Aqui o cálculo vai para processos separados, e quando a
+fila passa do limite o pedido é recusado na hora (PasswordHasherBusy)
+em vez de esperar.
+
+Formato gravado: scrypt$n$r$p$sal$hash (hex). Hashes antigos (SHA-256 puro,
+64 caracteres hex) continuam aceitos e são trocados no próximo login.
+"""
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+class PasswordHasherBusy(Exception):
+    """Fila do pool cheia (ou resposta demorou demais); o cliente deve tentar de novo"""
+
+
+def hash_password(password):
+    """Gera o hash scrypt da senha (roda no processo do pool)"""
+    salt = os.urandom(SALT_BYTES)
+    digest = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P,
+                            dklen=HASH_BYTES)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password, stored):
+    """Confere a senha; retorna (ok, novo_hash), com novo_hash quando o formato gravado está desatualizado"""
+    if not stored:
+        return False, None
+    if stored.startswith('scrypt$'):
+        _, n, r, p, salt, expected = stored.split('$')
+        digest = hashlib.scrypt(password.encode('utf-8'), salt=bytes.fromhex(salt), n=int(n), r=int(r), p=int(p),
+                                dklen=len(expected) // 2)
+        ok = hmac.compare_digest(digest.hex(), expected)
+        outdated = (int(n), int(r), int(p)) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    else:
+        # Formato antigo: SHA-256 sem sal
+        ok = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+        outdated = True
+    return ok, (hash_password(password) if ok and outdated else None)
+
+
+class PasswordHasher:
+    """Pool de processos para hash/verificação de senhas, com limite de pedidos pendentes.
+
+    Com workers=0 o hash roda na própria thread (só com o limite de
+    pendentes). Os processos são criados no primeiro uso, já dentro do
+    worker do Gunicorn, por fork: com spawn cada um reimportaria o módulo
+    principal (o app.py inteiro, com a carga dos dados). Eles só calculam
+    hashes, sem usar o estado herdado do worker.
+    """
+
+    def __init__(self, workers=2, max_pending=32, timeout=10.0, window=200):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.window = window
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.upgraded = 0
+        self._latencies = []
+
+    def hash(self, password):
+        return self._run(hash_password, password)
+
+    def verify(self, password, stored):
+        """Retorna (ok, novo_hash); novo_hash vem preenchido quando o hash gravado deve ser trocado"""
+        if not stored:
+            return False, None
+        ok, new_hash = self._run(verify_password, password, stored)
+        if new_hash:
+            with self._lock:
+                self.upgraded += 1
+        return ok, new_hash
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                'workers': self.workers,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'upgraded': self.upgraded,
+                'ms_p50': round(latencies[len(latencies) // 2], 1) if latencies else None,
+                'ms_p95': round(latencies[int(len(latencies) * 0.95)], 1) if latencies else None
+            }
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self._pending += 1
+            if self._executor is None and self.workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('fork')
+                )
+            executor = self._executor
+        started = time.perf_counter()
+        try:
+            if executor is None:
+                result = fn(*args)
+            else:
+                result = executor.submit(fn, *args).result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy()
+        finally:
+            with self._lock:
+                self._pending -= 1
+        with self._lock:
+            self.completed += 1
+            self._latencies.append((time.perf_counter() - started) * 1000)
+            if len(self._latencies) > self.window:
+                del self._latencies[0]
+        return result
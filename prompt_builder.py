@@ -0,0 +1,117 @@
+"""Montagem do prompt do chat em turnos (contents + systemInstruction) com orçamento de tokens
+
+O histórico entra como turnos user/model, do mais recente para o mais
+antigo, até acabar o orçamento de tokens (estimado localmente, sem chamar
+a API). Os turnos já codificados de cada usuário ficam em cache: a cada
+mensagem nova só os turnos novos são estimados.
+"""
+import math
+import re
+import threading
+from collections import OrderedDict, deque
+
+import gemini_client
+
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+
+def estimate_tokens(text):
+    """Estimativa do número de tokens: palavras e sinais, com folga para as palavras que viram vários tokens"""
+    return math.ceil(len(_TOKEN_RE.findall(text)) * 1.4)
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else None
+
+
+class PromptBuilder:
+    """Monta o corpo do generateContent e mede o tamanho dos prompts.
+
+    `history_tokens` é o orçamento do histórico; o prompt do sistema e a
+    mensagem atual entram sempre.
+    """
+
+    def __init__(self, system_prompt, history_tokens=3000, cache_size=1000, window=200):
+        self.system_prompt = system_prompt
+        self.system_tokens = estimate_tokens(system_prompt)
+        self.history_tokens = history_tokens
+        self.cache_size = cache_size
+        self._encoded = OrderedDict()  # user_id -> {(papel, texto): (turno, tokens)}
+        self._lock = threading.Lock()
+        self._prompt_tokens = deque(maxlen=window)
+        self._usage_tokens = deque(maxlen=window)
+        self.requests = 0
+        self.trimmed_messages = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def build(self, user_id, history, message):
+        """Retorna (payload, tokens estimados do prompt)"""
+        with self._lock:
+            previous = self._encoded.pop(user_id, {})
+        encoded = {}
+        hits = 0
+        for msg in history:
+            key = (msg.get('role'), msg.get('text', ''))
+            entry = previous.get(key)
+            if entry is None:
+                entry = (gemini_client.content(key[0], key[1]), estimate_tokens(key[1]))
+            else:
+                hits += 1
+            encoded[key] = entry
+
+        # Do mais recente para o mais antigo, enquanto couber no orçamento
+        contents = []
+        used = 0
+        for msg in reversed(history):
+            turn, tokens = encoded[(msg.get('role'), msg.get('text', ''))]
+            if used + tokens > self.history_tokens:
+                break
+            contents.append(turn)
+            used += tokens
+        contents.reverse()
+        trimmed = len(history) - len(contents)
+        # A conversa precisa começar com um turno do usuário
+        while contents and contents[0]['role'] != 'user':
+            contents.pop(0)
+
+        message_tokens = estimate_tokens(message)
+        contents.append(gemini_client.content('user', message))
+        total = self.system_tokens + used + message_tokens
+
+        with self._lock:
+            self._encoded[user_id] = encoded
+            while len(self._encoded) > self.cache_size:
+                self._encoded.popitem(last=False)
+            self.requests += 1
+            self.trimmed_messages += trimmed
+            self.cache_hits += hits
+            self.cache_misses += len(history) - hits
+            self._prompt_tokens.append(total)
+        return gemini_client.chat_payload(self.system_prompt, contents), total
+
+    def record_usage(self, usage):
+        """Registra a contagem real informada pelo Gemini (usageMetadata)"""
+        tokens = usage.get('promptTokenCount')
+        if tokens is not None:
+            with self._lock:
+                self._usage_tokens.append(tokens)
+
+    def stats(self):
+        with self._lock:
+            estimated = sorted(self._prompt_tokens)
+            actual = sorted(self._usage_tokens)
+            return {
+                'requests': self.requests,
+                'history_token_budget': self.history_tokens,
+                'system_tokens': self.system_tokens,
+                'trimmed_messages': self.trimmed_messages,
+                'cached_users': len(self._encoded),
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'prompt_tokens_p50': percentile(estimated, 0.5),
+                'prompt_tokens_p95': percentile(estimated, 0.95),
+                'prompt_tokens_max': estimated[-1] if estimated else None,
+                'usage_prompt_tokens_p50': percentile(actual, 0.5),
+                'usage_prompt_tokens_p95': percentile(actual, 0.95)
+            }
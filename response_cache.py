@@ -0,0 +1,106 @@
+"""Cache de respostas para perguntas repetidas (LRU com TTL e camada opcional em disco)"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def context_fingerprint(system_prompt, history_texts):
+    """Impressão digital do que, além da mensagem, vai no prompt (prompt do sistema e histórico)"""
+    digest = hashlib.sha256()
+    for part in (system_prompt, *history_texts):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def normalize_message(message):
+    """Normaliza o texto para que variações triviais caiam na mesma chave"""
+    text = unicodedata.normalize('NFKD', message.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip(' ?!.,;')
+
+
+class ResponseCache:
+    """LRU limitado com expiração por TTL.
+
+    Com `disk_path`, as respostas também são gravadas em um SQLite e
+    sobrevivem a reinícios; um miss na memória consulta o disco antes de
+    chamar o Gemini.
+    """
+
+    def __init__(self, max_entries=1000, ttl=86400, disk_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # chave -> (resposta, expira_em)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._disk = None
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute(
+                'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._disk.execute('DELETE FROM responses WHERE expires_at < ?', (time.time(),))
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(context, message):
+        """Chave: impressão digital do contexto + mensagem normalizada"""
+        return hashlib.sha256(f"{context}\x00{normalize_message(message)}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[key]
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    'SELECT response, expires_at FROM responses WHERE key = ? AND expires_at > ?', (key, now)
+                ).fetchone()
+                if row:
+                    self.disk_hits += 1
+                    self._store(key, row[0], row[1])
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, response, expires_at)
+            if self._disk is not None:
+                self._disk.execute(
+                    'INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)',
+                    (key, response, expires_at)
+                )
+                self._disk.commit()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses
+            }
+
+    def _store(self, key, response, expires_at):
+        # Chamado com o lock adquirido
+        self._entries[key] = (response, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,110 @@
+"""Política de novas tentativas baseada na classificação do erro"""
+import random
+import re
+import threading
+import time
+
+import requests
+
+from deadline import DeadlineExceeded
+from http_pool import RequestCancelled
+
+# Categorias de erro
+BAD_REQUEST = 'bad_request'    # 400: a mesma requisição vai falhar em qualquer chave
+NOT_FOUND = 'not_found'        # 404: modelo ou versão da API inexistente
+RATE_LIMITED = 'rate_limited'  # 429: trocar de chave
+AUTH = 'auth'                  # 401/403: chave inválida, trocar de chave
+TRANSIENT = 'transient'        # 5xx, timeouts e falhas de conexão: tentar de novo com backoff
+CANCELLED = 'cancelled'        # cancelada por nós (prazo ou hedge)
+UNKNOWN = 'unknown'
+
+
+def classify(error):
+    """Classifica o erro de uma chamada ao Gemini"""
+    if isinstance(error, (DeadlineExceeded, RequestCancelled)):
+        return CANCELLED
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return TRANSIENT
+    response = getattr(error, 'response', None)
+    status = response.status_code if response is not None else None
+    if status is None:
+        return UNKNOWN
+    if status == 429:
+        return RATE_LIMITED
+    if status in (401, 403):
+        return AUTH
+    if status == 404:
+        return NOT_FOUND
+    if status in (408, 500, 502, 503, 504):
+        return TRANSIENT
+    if 400 <= status < 500:
+        return BAD_REQUEST
+    return TRANSIENT
+
+
+def parse_retry_after(error):
+    """Lê o atraso sugerido pelo servidor (cabeçalho Retry-After ou RetryInfo do Gemini)"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    match = re.search(r'"retryDelay"\s*:\s*"([\d.]+)s"', response.text or '')
+    return float(match.group(1)) if match else None
+
+
+class RetryPolicy:
+    """Repete apenas erros transitórios, com backoff exponencial e jitter.
+
+    O atraso é sorteado entre 0 e base_delay * 2^tentativa (limitado a
+    max_delay). Um Retry-After do servidor é respeitado; se ele passar de
+    max_delay ou do prazo restante, a chamada desiste para que outra chave
+    seja usada.
+    """
+
+    def __init__(self, max_retries=2, base_delay=0.5, max_delay=8.0, sleep=time.sleep):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.errors = {}
+
+    def backoff(self, attempt, error=None):
+        """Atraso antes da tentativa seguinte (None se não valer a pena esperar)"""
+        retry_after = parse_retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn, deadline=None):
+        """Executa fn() repetindo erros transitórios"""
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                category = classify(e)
+                self._record(category)
+                if category != TRANSIENT or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt, e)
+                if delay is None or (deadline is not None and delay >= deadline.remaining() - deadline.min_step):
+                    raise
+                with self._lock:
+                    self.retries += 1
+                self.sleep(delay)
+                attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return {'retries': self.retries, 'errors': dict(self.errors)}
+
+    def _record(self, category):
+        with self._lock:
+            self.errors[category] = self.errors.get(category, 0) + 1
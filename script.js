@@ -823,6 +823,7 @@ class YasoudApp {
     }
 
     handleLogout() {
+        const token = localStorage.getItem('yasoud_token');
         this.isLoggedIn = false;
         this.currentUser = null;
         localStorage.removeItem('yasoud_user');
@@ -833,6 +834,7 @@ class YasoudApp {
         // Fazer logout no servidor
         fetch(`${API_BASE_URL}/api/auth/logout`, {
             method: 'POST',
+            headers: token ? { 'Authorization': `Bearer ${token}` } : {},
             credentials: 'include'
         }).catch(err => console.error('Erro no logout:', err));
         
@@ -856,7 +858,7 @@ class YasoudApp {
 
         try {
             const token = localStorage.getItem('yasoud_token');
-            const response = await fetch(`${API_BASE_URL}/api/chat`, {
+            const response = await fetch(`${API_BASE_URL}/api/chat/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -866,10 +868,11 @@ class YasoudApp {
                 body: JSON.stringify({ message })
             });
 
-            if (response.ok) {
-                const data = await response.json();
-                this.hideTypingIndicator();
-                this.addMessage(data.response, 'assistant');
+            if (response.ok && response.body) {
+                await this.readChatStream(response);
+            } else if (response.status === 404 || response.status === 405) {
+                // Backend sem suporte a streaming: usar o endpoint tradicional
+                await this.sendMessageWithoutStream(message, token);
             } else {
                 this.hideTypingIndicator();
                 const error = await response.json();
@@ -884,18 +887,85 @@ class YasoudApp {
         }
     }
 
-    addMessage(text, sender) {
-        const messagesContainer = document.getElementById('chatMessages');
-        if (!messagesContainer) return;
-        
-        const messageDiv = document.createElement('div');
-        messageDiv.className = `message ${sender}`;
-        
-        const time = new Date().toLocaleTimeString('pt-BR', { 
-            hour: '2-digit', 
-            minute: '2-digit' 
+    async sendMessageWithoutStream(message, token) {
+        const response = await fetch(`${API_BASE_URL}/api/chat`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${token}`
+            },
+            credentials: 'include',
+            body: JSON.stringify({ message })
         });
 
+        this.hideTypingIndicator();
+        if (response.ok) {
+            const data = await response.json();
+            this.addMessage(data.response, 'assistant');
+        } else {
+            const error = await response.json();
+            this.showNotification(error.message || 'Erro ao enviar mensagem.', 'error');
+            this.addMessage('Desculpe, ocorreu um erro. Por favor, tente novamente.', 'assistant');
+        }
+    }
+
+    async readChatStream(response) {
+        // Lê os eventos SSE e mostra a resposta conforme ela chega
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let finalText = null;
+        let messageDiv = null;
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+
+            for (const rawEvent of events) {
+                let eventName = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                });
+                if (!data) continue;
+
+                const payload = JSON.parse(data);
+                if (eventName === 'token') {
+                    text += payload.text;
+                    if (!messageDiv) {
+                        this.hideTypingIndicator();
+                        messageDiv = this.createMessageElement('', 'assistant');
+                    }
+                    this.updateMessageElement(messageDiv, text, 'assistant');
+                } else if (eventName === 'done') {
+                    finalText = payload.response;
+                }
+            }
+        }
+
+        this.hideTypingIndicator();
+        finalText = finalText || text || 'Desculpe, ocorreu um erro. Por favor, tente novamente.';
+        if (!messageDiv) {
+            messageDiv = this.createMessageElement('', 'assistant');
+        }
+        this.updateMessageElement(messageDiv, finalText, 'assistant');
+
+        // Salvar mensagem no histórico
+        this.messages.push({
+            text: finalText,
+            sender: 'assistant',
+            timestamp: new Date().toISOString()
+        });
+        this.saveChatHistory();
+    }
+
+    formatMessageText(text, sender) {
         // Formatar texto: converter quebras de linha em <br> e criar parágrafos
         let formattedText = this.escapeHtml(text);
         
@@ -911,14 +981,47 @@ class YasoudApp {
             // Para mensagens do usuário, apenas converter quebras de linha
             formattedText = formattedText.split('\n').join('<br>');
         }
+        return formattedText;
+    }
+
+    createMessageElement(text, sender) {
+        const messagesContainer = document.getElementById('chatMessages');
+        
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `message ${sender}`;
+        
+        const time = new Date().toLocaleTimeString('pt-BR', { 
+            hour: '2-digit', 
+            minute: '2-digit' 
+        });
 
         messageDiv.innerHTML = `
-            <div class="message-text">${formattedText}</div>
+            <div class="message-text">${this.formatMessageText(text, sender)}</div>
             <div class="message-time">${time}</div>
         `;
 
-        messagesContainer.appendChild(messageDiv);
-        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        if (messagesContainer) {
+            messagesContainer.appendChild(messageDiv);
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        }
+        return messageDiv;
+    }
+
+    updateMessageElement(messageDiv, text, sender) {
+        const textDiv = messageDiv.querySelector('.message-text');
+        if (textDiv) textDiv.innerHTML = this.formatMessageText(text, sender);
+
+        const messagesContainer = document.getElementById('chatMessages');
+        if (messagesContainer) {
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        }
+    }
+
+    addMessage(text, sender) {
+        const messagesContainer = document.getElementById('chatMessages');
+        if (!messagesContainer) return;
+        
+        this.createMessageElement(text, sender);
 
         // Salvar mensagem no histórico
         this.messages.push({
@@ -0,0 +1,93 @@
+"""Mede o tempo de inicialização e a memória (RSS) do histórico de chat conforme o número de usuários
+
+Compara o formato antigo (chat_history.json inteiro carregado na memória)
+com os arquivos por usuário carregados sob demanda. Cada medição roda em um
+processo novo, para que o RSS seja só o daquela carga.
+
+Uso: python scripts/benchmark_history_startup.py [usuários ...] (padrão: 1000 10000 100000)
+"""
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_journal import ChatJournal  # noqa: E402
+
+MESSAGES_PER_USER = 20
+ACTIVE_USERS = 1000
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+def load_legacy(path, results):
+    baseline = rss_mb()
+    started = time.perf_counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        history = json.load(f)
+    results.put(('json inteiro', time.perf_counter() - started, rss_mb() - baseline, len(history), None))
+
+
+def load_sharded(shard_dir, total, results):
+    baseline = rss_mb()
+    started = time.perf_counter()
+    journal = ChatJournal(shard_dir, os.path.join(shard_dir, 'journal'), cache_size=ACTIVE_USERS).load()
+    elapsed = time.perf_counter() - started
+    startup_rss = rss_mb() - baseline
+
+    rng = random.Random(42)
+    latencies = []
+    for _ in range(ACTIVE_USERS):
+        t = time.perf_counter()
+        journal.get(str(rng.randint(1, total)))
+        latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+    journal.close()
+    results.put(('por usuário', elapsed, startup_rss, total,
+                 (rss_mb() - baseline, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)])))
+
+
+def measure(target, *args):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=args + (results,))
+    process.start()
+    outcome = results.get()
+    process.join()
+    return outcome
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    for total in sizes:
+        workdir = tempfile.mkdtemp(prefix='yasoud-history-')
+        try:
+            legacy = os.path.join(workdir, 'chat_history.json')
+            with open(legacy, 'w', encoding='utf-8') as f:
+                json.dump({str(i): [{'role': 'user' if j % 2 == 0 else 'model', 'parts': [f'mensagem {j} de {i}'],
+                                     'text': f'mensagem {j} de {i}'} for j in range(MESSAGES_PER_USER)]
+                           for i in range(1, total + 1)}, f, ensure_ascii=False)
+            shard_dir = os.path.join(workdir, 'shards')
+            ChatJournal(shard_dir, os.path.join(shard_dir, 'journal'), legacy_snapshot=legacy).load().close()
+            os.replace(legacy + '.migrated', legacy)
+
+            print(f"\n=== {total} usuários ===")
+            name, elapsed, rss, _, _ = measure(load_legacy, legacy)
+            print(f"{name:<13} inicialização {elapsed * 1000:8.0f} ms  RSS +{rss:7.1f} MB")
+            name, elapsed, rss, _, active = measure(load_sharded, shard_dir, total)
+            print(f"{name:<13} inicialização {elapsed * 1000:8.0f} ms  RSS +{rss:7.1f} MB  "
+                  f"(após {ACTIVE_USERS} conversas: RSS +{active[0]:.1f} MB, "
+                  f"primeira leitura p50={active[1]:.3f} ms p95={active[2]:.3f} ms)")
+        finally:
+            shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Mede a vazão de logins e a latência das outras rotas com o hash de senhas na thread e no pool
+
+Sobe o app no Gunicorn (um worker, com a configuração do projeto) duas
+vezes: com PASSWORD_HASH_WORKERS=0 (scrypt na thread do pedido, como seria
+sem o pool) e com o pool de processos. Em cada rodada, várias threads
+fazem login sem parar enquanto outras chamam /api/auth/verify, que faz o
+papel das rotas rápidas do chat, e medimos as duas coisas.
+
+Uso: python scripts/benchmark_password_hashing.py [--logins 8] [--readers 4] [--seconds 10] [--pool-workers 2]
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from password_hasher import hash_password  # noqa: E402
+
+PORT = 5099
+USERS = 20
+
+
+def seed(workdir):
+    data_dir = os.path.join(workdir, 'data')
+    os.makedirs(data_dir)
+    users = {}
+    for i in range(1, USERS + 1):
+        email = f'usuario{i}@exemplo.com'
+        users[email] = {'id': str(i), 'name': f'Usuário {i}', 'email': email,
+                        'password_hash': hash_password('senha'), 'created_at': ''}
+    with open(os.path.join(data_dir, 'users.json'), 'w', encoding='utf-8') as f:
+        json.dump(users, f, indent=2, ensure_ascii=False)
+
+
+def wait_ready(base):
+    for _ in range(100):
+        try:
+            requests.get(f'{base}/api/metrics', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('o servidor não subiu')
+
+
+def run(label, workdir, args, hash_workers):
+    env = dict(os.environ, PORT=str(PORT), WEB_CONCURRENCY='1', STORAGE_BACKEND='json',
+               PASSWORD_HASH_WORKERS=str(hash_workers), PASSWORD_HASH_MAX_PENDING='1000')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--chdir', workdir, '--pythonpath', ROOT, 'app:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f'http://127.0.0.1:{PORT}'
+    try:
+        wait_ready(base)
+        session = requests.Session()
+        token = session.post(f'{base}/api/auth/login',
+                             json={'email': 'usuario1@exemplo.com', 'password': 'senha'}).json()['token']
+        stop = time.monotonic() + args.seconds
+        logins = []
+        latencies = []
+
+        def login_loop(n):
+            s = requests.Session()
+            while time.monotonic() < stop:
+                r = s.post(f'{base}/api/auth/login',
+                           json={'email': f'usuario{n % USERS + 1}@exemplo.com', 'password': 'senha'})
+                logins.append(r.status_code)
+
+        def reader_loop():
+            s = requests.Session()
+            while time.monotonic() < stop:
+                started = time.perf_counter()
+                s.get(f'{base}/api/auth/verify', headers={'Authorization': f'Bearer {token}'})
+                latencies.append((time.perf_counter() - started) * 1000)
+                time.sleep(0.01)
+
+        threads = [threading.Thread(target=login_loop, args=(n,)) for n in range(args.logins)]
+        threads += [threading.Thread(target=reader_loop) for _ in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        latencies.sort()
+        ok = sum(1 for status in logins if status == 200)
+        print(f"{label:<22} logins/s {ok / args.seconds:6.1f}  (429: {logins.count(429)})  "
+              f"verify p50={latencies[len(latencies) // 2]:7.1f} ms  "
+              f"p95={latencies[int(len(latencies) * 0.95)]:7.1f} ms  max={latencies[-1]:7.1f} ms")
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=8, help='threads fazendo login')
+    parser.add_argument('--readers', type=int, default=4, help='threads chamando /api/auth/verify')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--pool-workers', type=int, default=2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='yasoud-hash-')
+    try:
+        seed(workdir)
+        run('scrypt na thread', workdir, args, 0)
+        run(f'pool ({args.pool_workers} processos)', workdir, args, args.pool_workers)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Mede a latência de busca do cache semântico com muitas entradas
+
+Uso: python scripts/benchmark_semantic_cache.py [entradas] [buscas]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from semantic_cache import SemanticCache, vectorize  # noqa: E402
+
+WORDS = ['livro', 'mórmon', 'jesus', 'cristo', 'oração', 'batismo', 'templo', 'família', 'fé', 'profeta',
+         'missão', 'escrituras', 'arrependimento', 'paz', 'amor', 'igreja', 'sacramento', 'dízimo']
+CONTEXT = 'a' * 64
+
+
+def random_question(rng):
+    return 'o que é ' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    rng = random.Random(42)
+    cache = SemanticCache(max_entries=entries)
+
+    started = time.perf_counter()
+    # Preencher direto a matriz (o custo de vetorização é medido à parte)
+    questions = [random_question(rng) for _ in range(1000)]
+    vectors = np.stack([vectorize(q, cache.dim) for q in questions])
+    for i in range(entries):
+        cache._vectors[i] = vectors[i % len(vectors)]
+        cache._responses[i] = f'resposta {i}'
+    cache._contexts[:] = int(CONTEXT[:15], 16)
+    cache._expires[:] = time.time() + 3600
+    cache._size = entries
+    print(f"{entries} entradas carregadas em {time.perf_counter() - started:.2f}s "
+          f"({cache._vectors.nbytes / 1024 / 1024:.0f} MB de vetores)")
+
+    started = time.perf_counter()
+    for q in questions[:lookups]:
+        vectorize(q, cache.dim)
+    vectorize_ms = (time.perf_counter() - started) * 1000 / lookups
+
+    latencies = []
+    for _ in range(lookups):
+        q = random_question(rng)
+        t = time.perf_counter()
+        cache.lookup(q, CONTEXT)
+        latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+
+    print(f"vetorização: {vectorize_ms:.3f} ms/pergunta")
+    print(f"busca ({lookups} consultas): p50={latencies[len(latencies) // 2]:.2f} ms "
+          f"p95={latencies[int(len(latencies) * 0.95)]:.2f} ms max={latencies[-1]:.2f} ms")
+    print(f"acertos={cache.hits} erros={cache.misses}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Compara os backends de armazenamento (arquivos JSON e SQLite) com muitos usuários
+
+Mede a carga inicial, o login (busca por e-mail), a verificação do token
+(busca por id), a leitura das últimas mensagens, a gravação de uma troca de
+mensagens e o cadastro de um usuário.
+
+Uso: python scripts/benchmark_storage.py [usuários ...] (padrão: 10000 100000)
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_journal import ChatJournal  # noqa: E402
+from storage import JsonStorage, SqliteStorage  # noqa: E402
+
+MESSAGES_PER_USER = 10
+OPERATIONS = 500
+
+
+def make_user(i):
+    return {
+        'id': str(i),
+        'name': f'Usuário {i}',
+        'email': f'usuario{i}@exemplo.com',
+        'password_hash': '0' * 64,
+        'created_at': '2024-01-01T00:00:00+00:00'
+    }
+
+
+def make_messages(i):
+    return [{'role': 'user' if j % 2 == 0 else 'model', 'parts': [f'mensagem {j} do usuário {i}'],
+             'text': f'mensagem {j} do usuário {i}'} for j in range(MESSAGES_PER_USER)]
+
+
+def timed(label, fn, samples):
+    latencies = []
+    for sample in samples:
+        started = time.perf_counter()
+        fn(sample)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(f"  {label:<22} p50={latencies[len(latencies) // 2]:8.3f} ms  "
+          f"p95={latencies[int(len(latencies) * 0.95)]:8.3f} ms")
+
+
+def run(name, open_storage, total, rng):
+    started = time.perf_counter()
+    storage = open_storage()
+    print(f"{name}: carga inicial {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    ids = [rng.randint(1, total) for _ in range(OPERATIONS)]
+    timed('login (e-mail)', lambda i: storage.get_user_by_email(f'usuario{i}@exemplo.com'), ids)
+    timed('verify (id)', lambda i: storage.get_user_by_id(str(i)), ids)
+    timed('últimas mensagens', lambda i: storage.recent_messages(str(i), 10), ids)
+    timed('gravar troca', lambda i: storage.append_messages(str(i), make_messages(i)[:2]), ids)
+    # Cadastro é mais lento no JSON (reescreve o arquivo inteiro): menos amostras
+    timed('cadastro', lambda i: storage.add_user(make_user(i)), range(total + 1, total + 21))
+    storage.close()
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    rng = random.Random(42)
+    for total in sizes:
+        workdir = tempfile.mkdtemp(prefix='yasoud-bench-')
+        try:
+            users = {}
+            history = {}
+            for i in range(1, total + 1):
+                user = make_user(i)
+                users[user['email']] = user
+                history[user['id']] = make_messages(i)
+
+            users_file = os.path.join(workdir, 'users.json')
+            history_file = os.path.join(workdir, 'chat_history.json')
+            shard_dir = os.path.join(workdir, 'chat_history')
+            journal_file = history_file + '.journal'
+            with open(users_file, 'w', encoding='utf-8') as f:
+                json.dump(users, f, indent=2, ensure_ascii=False)
+            with open(history_file, 'w', encoding='utf-8') as f:
+                json.dump(history, f, ensure_ascii=False)
+            history_mb = os.path.getsize(history_file) / 1024 / 1024
+            # Dividir o histórico em arquivos por usuário (migração do formato antigo)
+            ChatJournal(shard_dir, journal_file, legacy_snapshot=history_file).load().close()
+
+            sqlite_path = os.path.join(workdir, 'yasoud.sqlite3')
+            SqliteStorage(sqlite_path).import_json(users, history.items())
+
+            print(f"\n=== {total} usuários (users.json {os.path.getsize(users_file) / 1024 / 1024:.1f} MB, "
+                  f"histórico {history_mb:.1f} MB, SQLite {os.path.getsize(sqlite_path) / 1024 / 1024:.1f} MB) ===")
+            run('json', lambda: JsonStorage(users_file, ChatJournal(shard_dir, journal_file)).load(), total, rng)
+            run('sqlite', lambda: SqliteStorage(sqlite_path).load(), total, rng)
+        finally:
+            shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
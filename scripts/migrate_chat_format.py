@@ -0,0 +1,107 @@
+"""Converte o histórico de chat em disco para o formato compacto (versão 2)
+
+Divide o chat_history.json antigo (se ainda existir), passa o journal para
+os arquivos de usuário e reescreve todos os arquivos de usuário no formato
+atual. Com --compress, os arquivos de usuários sem conversa há --cold-days
+dias são comprimidos (gzip, ou zstd se o pacote zstandard estiver
+instalado). Mostra o tamanho e o tempo de leitura antes e depois.
+
+Rode com o app parado.
+
+Uso: python scripts/migrate_chat_format.py [--data-dir data] [--compress gzip|zstd] [--cold-days 30] [--dry-run]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_journal import ChatJournal, read_shard_file, write_shard_file  # noqa: E402
+from message_format import GZIP, ZSTD, dumps, encode_message, FORMAT_VERSION  # noqa: E402
+
+
+def read_all(paths):
+    """Lê todos os arquivos; retorna (bytes, segundos)"""
+    total = 0
+    started = time.perf_counter()
+    for path in paths:
+        total += os.path.getsize(path)
+        read_shard_file(path)
+    return total, time.perf_counter() - started
+
+
+def report(label, size, seconds):
+    print(f"{label:<28} {size / 1024 / 1024:9.2f} MB   leitura {seconds * 1000:8.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--compress', choices=[GZIP, ZSTD], help='comprimir os arquivos de usuários inativos')
+    parser.add_argument('--cold-days', type=float, default=30, help='dias sem conversa para comprimir')
+    parser.add_argument('--dry-run', action='store_true', help='só medir, sem gravar nada')
+    args = parser.parse_args()
+
+    legacy = os.path.join(args.data_dir, 'chat_history.json')
+    shard_dir = os.path.join(args.data_dir, 'chat_history')
+    journal_file = legacy + '.journal'
+
+    legacy_size = None
+    if os.path.exists(legacy):
+        legacy_size = os.path.getsize(legacy)
+        started = time.perf_counter()
+        with open(legacy, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        report('chat_history.json (antigo)', legacy_size, time.perf_counter() - started)
+        print(f"  {len(data) - ('__seq__' in data)} usuário(s) no arquivo único")
+
+    if args.dry_run:
+        paths = list(ChatJournal(shard_dir, journal_file).shard_paths())
+        size, seconds = read_all(paths)
+        report(f'{len(paths)} arquivo(s) de usuário', size, seconds)
+        after = 0
+        cold_before = time.time() - args.cold_days * 86400
+        for path in paths:
+            user_id, seq, messages = read_shard_file(path)
+            compression = args.compress if os.path.getmtime(path) < cold_before else None
+            after += len(dumps({'v': FORMAT_VERSION, 'user': user_id, 'seq': seq,
+                                'messages': [encode_message(m) for m in messages]}, compression))
+        print(f"{'depois (estimado)':<28} {after / 1024 / 1024:9.2f} MB")
+        return
+
+    # Dividir o arquivo antigo e passar o journal para os arquivos de usuário
+    journal = ChatJournal(shard_dir, journal_file, legacy_snapshot=legacy).load()
+    journal.compact()
+    journal.close()
+
+    paths = list(journal.shard_paths())
+    size, seconds = read_all(paths)
+    report(f'{len(paths)} arquivo(s) de usuário', size, seconds)
+
+    cold_before = time.time() - args.cold_days * 86400
+    compressed = 0
+    started = time.perf_counter()
+    for path in paths:
+        mtime = os.path.getmtime(path)
+        user_id, seq, messages = read_shard_file(path)
+        compression = args.compress if mtime < cold_before else None
+        compressed += compression is not None
+        write_shard_file(path, user_id, seq, messages, durable=False, compression=compression)
+        # Manter a data da última conversa, que define se o arquivo é frio
+        os.utime(path, (mtime, mtime))
+    if hasattr(os, 'sync'):
+        os.sync()
+    print(f"convertidos em {time.perf_counter() - started:.1f}s ({compressed} comprimido(s))")
+
+    size_after, seconds_after = read_all(paths)
+    report('depois', size_after, seconds_after)
+    if size:
+        print(f"redução de {100 * (1 - size_after / size):.0f}% no tamanho")
+    if legacy_size:
+        print(f"redução de {100 * (1 - size_after / legacy_size):.0f}% em relação ao chat_history.json")
+
+
+if __name__ == '__main__':
+    main()
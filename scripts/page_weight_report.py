@@ -0,0 +1,56 @@
+"""Relatório do peso da página inicial antes e depois dos arquivos otimizados
+
+"Antes" é o que o servidor mandava: index.html, CSS, JS e imagens originais,
+sem compressão. "Depois" é o que cada tipo de navegador baixa na primeira
+visita com os arquivos pré-comprimidos e as versões menores das fotos
+(largura pedida pelo srcset conforme a densidade da tela). Nas visitas
+seguintes só o index.html é revalidado (304).
+
+Uso: python scripts/page_weight_report.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import static_assets  # noqa: E402
+from static_assets import INDEX, StaticAssets  # noqa: E402
+
+MODERN = ['image/avif', 'image/webp']
+BROWSERS = (
+    ('AVIF + brotli, tela 1x', ['br', 'gzip'], MODERN, 120),
+    ('AVIF + brotli, tela 2x', ['br', 'gzip'], MODERN, 240),
+    ('AVIF + brotli, tela 3x', ['br', 'gzip'], MODERN, 360),
+    ('WebP + gzip, tela 2x', ['gzip'], ['image/webp'], 240),
+    ('só PNG + gzip, tela 2x', ['gzip'], [], 240),
+)
+
+
+def main():
+    if static_assets.Image is None:
+        print("⚠️ Pillow não instalado: as fotos não terão versões menores")
+    out_dir = tempfile.mkdtemp(prefix='yasoud-static-')
+    try:
+        assets = StaticAssets(ROOT, out_dir).build()
+        before = sum(os.path.getsize(os.path.join(ROOT, name)) for name in assets.assets + (INDEX,)
+                     if os.path.exists(os.path.join(ROOT, name)))
+        print(f"{'antes (arquivos originais)':<28} {before / 1024:8.1f} KB")
+        for label, encodings, image_types, width in BROWSERS:
+            after = assets.page_weight(encodings, image_types, width)
+            print(f"{label:<28} {after / 1024:8.1f} KB  ({100 * (1 - after / before):.1f}% menor)")
+
+        print("\nPor arquivo (AVIF + brotli, tela 2x):")
+        for asset in assets.published():
+            original = os.path.getsize(asset.files['identity'])
+            path, mimetype, encoding, _ = asset.select(['br', 'gzip'], MODERN, 240 if asset.variants else None)
+            detail = encoding if encoding != 'identity' else mimetype
+            print(f"  {asset.name:<14} {original / 1024:8.1f} KB -> {os.path.getsize(path) / 1024:7.1f} KB  ({detail})")
+    finally:
+        shutil.rmtree(out_dir)
+
+
+if __name__ == '__main__':
+    main()
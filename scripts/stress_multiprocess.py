@@ -0,0 +1,135 @@
+"""Teste de estresse do armazenamento compartilhado com vários processos (como os workers do Gunicorn)
+
+Cada processo cadastra seus usuários, confere que enxerga os usuários
+cadastrados pelos outros (por e-mail e por id, como no login e no verify) e
+depois grava trocas de mensagens no histórico de todos os usuários, lendo o
+histórico antes de cada gravação, como o /api/chat. No fim, confere que
+nenhum id se repetiu, que nenhuma mensagem se perdeu e que a sequência de
+cada histórico não tem buracos.
+
+Uso: python scripts/stress_multiprocess.py [processos ...] [--users N] [--rounds N] [--mode batched]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import SqliteStorage  # noqa: E402
+from write_behind import WriteBehind  # noqa: E402
+
+# Sem limite de histórico, para que todas as mensagens possam ser contadas
+MAX_MESSAGES = 10 ** 9
+
+
+def email_for(worker, i):
+    return f'w{worker}-u{i}@exemplo.com'
+
+
+def worker_main(worker, processes, args, path, barrier, results):
+    storage = WriteBehind(SqliteStorage(path, max_messages=MAX_MESSAGES), mode=args.mode)
+    errors = []
+
+    for i in range(args.users):
+        user_id = storage.allocate_user_id()
+        storage.add_user({'id': user_id, 'name': f'Usuário {worker}-{i}', 'email': email_for(worker, i),
+                          'password_hash': None, 'created_at': ''})
+    storage.flush()
+    barrier.wait()
+
+    user_ids = []
+    for other in range(processes):
+        for i in range(args.users):
+            user = storage.get_user_by_email(email_for(other, i))
+            if user is None:
+                errors.append(f'processo {worker} não encontrou {email_for(other, i)}')
+                continue
+            if (storage.get_user_by_id(user['id']) or {}).get('email') != user['email']:
+                errors.append(f'processo {worker}: id {user["id"]} não corresponde a {user["email"]}')
+            user_ids.append(user['id'])
+    barrier.wait()
+
+    started = time.perf_counter()
+    operations = 0
+    for round_ in range(args.rounds):
+        for user_id in user_ids:
+            storage.get_user_by_id(user_id)
+            storage.recent_messages(user_id, 10)
+            storage.append_messages(user_id, [
+                {'role': 'user', 'parts': [f'p{worker}r{round_}'], 'text': f'p{worker}r{round_}'},
+                {'role': 'model', 'parts': ['ok'], 'text': 'ok'}
+            ])
+            operations += 3
+    storage.close()
+    results.put((worker, operations, time.perf_counter() - started, errors))
+
+
+def check(path, processes, args):
+    """Confere o banco depois do teste; retorna a lista de problemas"""
+    db = sqlite3.connect(path)
+    problems = []
+    expected_users = processes * args.users
+    users, distinct_ids, distinct_emails = db.execute(
+        'SELECT COUNT(*), COUNT(DISTINCT id), COUNT(DISTINCT email) FROM users').fetchone()
+    if not users == distinct_ids == distinct_emails == expected_users:
+        problems.append(f'{users} usuários ({distinct_ids} ids, {distinct_emails} e-mails), esperado {expected_users}')
+
+    expected_messages = processes * args.rounds * 2
+    for user_id, count, first, last in db.execute(
+            'SELECT user_id, COUNT(*), MIN(seq), MAX(seq) FROM messages GROUP BY user_id'):
+        if count != expected_messages or first != 1 or last != count:
+            problems.append(f'usuário {user_id}: {count} mensagens (seq {first}..{last}), esperado {expected_messages}')
+    if db.execute('PRAGMA integrity_check').fetchone()[0] != 'ok':
+        problems.append('integrity_check falhou')
+    db.close()
+    return problems
+
+
+def run(processes, args):
+    workdir = tempfile.mkdtemp(prefix='yasoud-stress-')
+    path = os.path.join(workdir, 'yasoud.sqlite3')
+    try:
+        SqliteStorage(path).close()
+        barrier = multiprocessing.Barrier(processes)
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=worker_main, args=(w, processes, args, path, barrier, results))
+                   for w in range(processes)]
+        started = time.perf_counter()
+        for p in workers:
+            p.start()
+        outcomes = [results.get() for _ in workers]
+        for p in workers:
+            p.join()
+        elapsed = time.perf_counter() - started
+
+        operations = sum(o[1] for o in outcomes)
+        chat_seconds = max(o[2] for o in outcomes)
+        errors = [e for o in outcomes for e in o[3]] + check(path, processes, args)
+        print(f"{processes} processo(s): {operations} operações em {chat_seconds:.2f}s "
+              f"= {operations / chat_seconds:,.0f} ops/s (total {elapsed:.2f}s) "
+              f"{'OK' if not errors else f'{len(errors)} ERRO(S)'}")
+        for error in errors[:10]:
+            print(f"  - {error}")
+        return not errors
+    finally:
+        shutil.rmtree(workdir)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('processes', nargs='*', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--users', type=int, default=50, help='usuários cadastrados por processo')
+    parser.add_argument('--rounds', type=int, default=4, help='mensagens enviadas a cada usuário por processo')
+    parser.add_argument('--mode', default='batched', choices=['sync', 'batched', 'async'])
+    args = parser.parse_args()
+    ok = all([run(processes, args) for processes in args.processes])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Cache semântico: reaproveita respostas de perguntas parecidas (paráfrases)
+
+As perguntas viram vetores de n-gramas de caracteres com hashing, guardados
+em uma matriz NumPy; a busca é um produto matricial (similaridade de
+cosseno) seguido de top-k. Tudo roda na CPU, sem modelo externo.
+"""
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from response_cache import normalize_message
+
+
+def vectorize(text, dim=512, ngram_sizes=(2, 3, 4)):
+    """Vetor normalizado (L2) de n-gramas de caracteres com hashing"""
+    vector = np.zeros(dim, dtype=np.float32)
+    padded = f" {normalize_message(text)} "
+    for n in ngram_sizes:
+        for i in range(len(padded) - n + 1):
+            h = zlib.crc32(padded[i:i + n].encode('utf-8'))
+            # O bit mais alto do hash define o sinal (reduz colisões)
+            vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def context_id(context):
+    """Converte a impressão digital (hex) do contexto em um inteiro de 63 bits"""
+    return int(context[:15], 16)
+
+
+class SemanticCache:
+    """Matriz de vetores com busca top-k por similaridade de cosseno.
+
+    Só são comparadas entradas com o mesmo contexto (prompt do sistema e
+    histórico). Quando a capacidade acaba, as entradas mais antigas são
+    sobrescritas; entradas vencidas (TTL) são ignoradas na busca.
+    """
+
+    def __init__(self, max_entries=10000, dim=512, threshold=0.85, ttl=86400, top_k=5):
+        self.max_entries = max_entries
+        self.dim = dim
+        self.threshold = threshold
+        self.ttl = ttl
+        self.top_k = top_k
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._contexts = np.zeros(max_entries, dtype=np.int64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._responses = [None] * max_entries
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, message, context):
+        """Retorna (resposta, similaridade) da entrada mais parecida acima do limiar, ou (None, melhor similaridade)"""
+        query = vectorize(message, self.dim)
+        ctx = context_id(context)
+        now = time.time()
+        with self._lock:
+            size = self._size
+            if size == 0:
+                self.misses += 1
+                return None, 0.0
+            scores = self._vectors[:size] @ query
+            # Descartar outros contextos e entradas vencidas
+            scores[(self._contexts[:size] != ctx) | (self._expires[:size] < now)] = -1.0
+            k = min(self.top_k, size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            best = top[np.argmax(scores[top])]
+            score = float(scores[best])
+            if score >= self.threshold:
+                self.hits += 1
+                return self._responses[best], score
+            self.misses += 1
+            return None, max(score, 0.0)
+
+    def add(self, message, context, response):
+        vector = vectorize(message, self.dim)
+        with self._lock:
+            slot = self._next
+            self._vectors[slot] = vector
+            self._contexts[slot] = context_id(context)
+            self._expires[slot] = time.time() + self.ttl
+            self._responses[slot] = response
+            self._next = (slot + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': self._size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'threshold': self.threshold
+            }
@@ -0,0 +1,63 @@
+"""Coalescência de chamadas idênticas em andamento ("single flight")"""
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Chamadas simultâneas com a mesma chave compartilham uma única execução.
+
+    A primeira chamada executa a função; as que chegam enquanto ela está em
+    andamento esperam e recebem o mesmo resultado (ou o mesmo erro).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key, fn, timeout=None):
+        """Executa fn() uma vez por chave; retorna (resultado, compartilhado)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            if not call.done.wait(timeout):
+                return None, True
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'upstream_calls': self.executions,
+                'saved_calls': self.shared
+            }
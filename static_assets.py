@@ -0,0 +1,220 @@
+"""Arquivos estáticos com hash no nome, pré-comprimidos (gzip/brotli) e cache imutável
+
+Na inicialização, cada arquivo da página (CSS, JS e imagens) é copiado para
+`out_dir` como nome.<hash>.ext, junto com as versões .gz e .br (brotli, se
+o pacote estiver instalado) quando a compressão vale a pena. O index.html é
+reescrito para apontar para esses nomes. Como o nome muda junto com o
+conteúdo, os arquivos podem ser servidos com Cache-Control: immutable; só o
+index.html é revalidado (ETag) a cada visita.
+
+As fotos grandes (RESPONSIVE_IMAGES) ganham versões menores em AVIF, WebP
+e no formato original (se o Pillow estiver instalado). O index.html passa a
+pedi-las com srcset (?w=largura) e o servidor escolhe o formato pelo
+Accept do navegador.
+"""
+import gzip
+import hashlib
+import io
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+ASSETS = ('style.css', 'script.js', 'igreja.webp', 'iago.png', 'gb.png')
+INDEX = 'index.html'
+# Tipos que valem a pena comprimir (PNG e WebP já são comprimidos)
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# Só guardar a versão comprimida se ela economizar pelo menos isso
+MIN_SAVING = 0.1
+
+# Fotos com versões menores -> largura em que aparecem na página (atributo sizes)
+RESPONSIVE_IMAGES = {'iago.png': '120px', 'gb.png': '120px'}
+# Larguras geradas (1x, 2x e 3x dos 120px do avatar) e a usada no src, para quem ignora o srcset
+IMAGE_WIDTHS = (120, 240, 360)
+DEFAULT_IMAGE_WIDTH = 240
+# Formatos modernos, na ordem de preferência: (tipo, formato do Pillow, extensão, opções)
+IMAGE_FORMATS = (
+    ('image/avif', 'AVIF', '.avif', {'quality': 55}),
+    ('image/webp', 'WEBP', '.webp', {'quality': 80, 'method': 6}),
+)
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+class Asset:
+    """Um arquivo publicado: nome com hash, tipo e caminhos de cada codificação"""
+
+    def __init__(self, name, url, mimetype, etag, files, variants=None):
+        self.name = name
+        self.url = url
+        self.mimetype = mimetype
+        self.etag = etag
+        self.files = files  # codificação ('identity', 'br', 'gzip') -> caminho
+        self.variants = variants or {}  # tipo -> [(largura, caminho)] em ordem crescente
+
+    def select(self, encodings, image_types, width=None):
+        """Escolhe o arquivo para o navegador; retorna (caminho, tipo, codificação, etag).
+
+        `encodings` e `image_types` são as codificações e os tipos que o
+        navegador declarou aceitar explicitamente; `width` é a largura pedida
+        (?w=) para as imagens com versões menores.
+        """
+        if width and self.variants:
+            mimetype = next((t for t, _, _, _ in IMAGE_FORMATS if t in image_types and t in self.variants),
+                            self.mimetype)
+            sizes = self.variants.get(mimetype)
+            if sizes:
+                chosen_width, path = next(((w, p) for w, p in sizes if w >= width), sizes[-1])
+                return path, mimetype, 'identity', f"{self.etag}-w{chosen_width}-{mimetype.split('/')[1]}"
+        for encoding in ('br', 'gzip'):
+            if encoding in self.files and encoding in encodings:
+                return self.files[encoding], self.mimetype, encoding, f"{self.etag}-{encoding}"
+        return self.files['identity'], self.mimetype, 'identity', f"{self.etag}-identity"
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def write_once(path, data):
+    """Grava de forma atômica; com o hash no nome, um arquivo que já existe está certo"""
+    if os.path.exists(path):
+        return
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class StaticAssets:
+    """Gera e localiza os arquivos publicados; `url_prefix` é a rota que os serve"""
+
+    def __init__(self, src_dir, out_dir, url_prefix='/assets/', assets=ASSETS):
+        self.src_dir = src_dir
+        self.out_dir = os.path.abspath(out_dir)
+        self.url_prefix = url_prefix
+        self.assets = assets
+        self._by_name = {}  # nome original -> Asset
+        self._by_file = {}  # nome com hash -> Asset
+        self.index = None
+
+    def build(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        for name in self.assets:
+            path = os.path.join(self.src_dir, name)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = content_hash(data)
+            base, ext = os.path.splitext(name)
+            asset = self._publish(name, f"{base}.{digest}{ext}", data, digest)
+            self._by_name[name] = asset
+            self._by_file[os.path.basename(asset.files['identity'])] = asset
+
+        with open(os.path.join(self.src_dir, INDEX), 'rb') as f:
+            html = self.rewrite(f.read().decode('utf-8')).encode('utf-8')
+        digest = content_hash(html)
+        self.index = self._publish(INDEX, f"index.{digest}.html", html, digest)
+        return self
+
+    def rewrite(self, html):
+        """Troca src="style.css" (e afins) pela URL com hash; fotos com versões menores ganham srcset"""
+        def replace(match):
+            asset = self._by_name.get(match.group(2))
+            if not asset:
+                return match.group(0)
+            sizes = next(iter(asset.variants.values()), None)
+            if match.group(1) != 'src' or not sizes:
+                return f'{match.group(1)}="{asset.url}"'
+            srcset = ', '.join(f"{asset.url}?w={width} {width}w" for width, _ in sizes)
+            default = min((w for w, _ in sizes if w >= DEFAULT_IMAGE_WIDTH), default=sizes[-1][0])
+            return (f'src="{asset.url}?w={default}" srcset="{srcset}" '
+                    f'sizes="{RESPONSIVE_IMAGES[asset.name]}"')
+
+        return re.sub(r'\b(src|href)="([^"]+)"', replace, html)
+
+    def lookup(self, filename):
+        return self._by_file.get(filename)
+
+    def published(self):
+        """Todos os arquivos publicados, com o index.html por último"""
+        return list(self._by_name.values()) + [self.index]
+
+    def page_weight(self, encodings=(), image_types=(), width=None):
+        """Bytes que um navegador baixa na primeira visita (index.html e cada arquivo uma vez)"""
+        total = 0
+        for asset in self.published():
+            path = asset.select(encodings, image_types, width if asset.variants else None)[0]
+            total += os.path.getsize(path)
+        return total
+
+    def stats(self):
+        return {
+            'assets': len(self._by_name),
+            'image_variants': sum(len(sizes) for asset in self._by_name.values() for sizes in asset.variants.values()),
+            'page_bytes': self.page_weight(),
+            'page_bytes_modern': self.page_weight(('br', 'gzip'), [t for t, _, _, _ in IMAGE_FORMATS],
+                                                  DEFAULT_IMAGE_WIDTH)
+        }
+
+    def _publish(self, name, filename, data, digest):
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        path = os.path.join(self.out_dir, filename)
+        write_once(path, data)
+        files = {'identity': path}
+        if mimetype.startswith(COMPRESSIBLE):
+            variants = [('gzip', '.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.insert(0, ('br', '.br', lambda: brotli.compress(data, quality=11)))
+            for encoding, suffix, compress in variants:
+                variant_path = path + suffix
+                if not os.path.exists(variant_path):
+                    compressed = compress()
+                    if len(compressed) > len(data) * (1 - MIN_SAVING):
+                        continue
+                    write_once(variant_path, compressed)
+                files[encoding] = variant_path
+        variants = self._publish_images(path, data) if name in RESPONSIVE_IMAGES else None
+        return Asset(name, self.url_prefix + filename, mimetype, digest, files, variants)
+
+    def _publish_images(self, path, data):
+        """Gera (ou reaproveita) as versões menores da foto; sem Pillow, nenhuma"""
+        if Image is None:
+            return None
+        base, ext = os.path.splitext(path)
+        original_format = (mimetypes.guess_type(path)[0], None, ext, {'optimize': True})
+        variants = {}
+        image = None
+        for mimetype, pil_format, suffix, options in IMAGE_FORMATS + (original_format,):
+            sizes = []
+            for width in IMAGE_WIDTHS:
+                variant_path = f"{base}.w{width}{suffix}"
+                if not os.path.exists(variant_path):
+                    if image is None:
+                        image = Image.open(io.BytesIO(data))
+                        image.load()
+                    if width >= image.width:
+                        continue
+                    resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+                    out = io.BytesIO()
+                    try:
+                        resized.save(out, format=pil_format or image.format, **options)
+                    except (KeyError, OSError, ValueError):
+                        # Pillow sem suporte ao formato (ex.: AVIF)
+                        break
+                    write_once(variant_path, out.getvalue())
+                sizes.append((width, variant_path))
+            if sizes:
+                variants[mimetype] = sizes
+        return variants
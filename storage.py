@@ -0,0 +1,337 @@
+"""Armazenamento de usuários e histórico de chat
+
+Dois backends com a mesma interface:
+- JsonStorage: users.json em memória (reescrito a cada alteração) e histórico no ChatJournal
+  (um arquivo por usuário, carregado sob demanda);
+  só um processo pode usá-lo por vez
+- SqliteStorage: SQLite em modo WAL, com busca indexada por e-mail, por id e por (usuário, seq);
+  compartilhado entre todos os workers do Gunicorn
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from message_format import decode_message
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: sem trava entre processos
+
+BACKEND_JSON = 'json'
+BACKEND_SQLITE = 'sqlite'
+
+# Operações de gravação aceitas por write_batch:
+# (USER_OP, usuário, e-mail antigo ou None se for um usuário novo)
+# (MESSAGES_OP, id do usuário, mensagens)
+USER_OP = 'user'
+MESSAGES_OP = 'messages'
+
+
+def load_users_file(path):
+    """Carrega o users.json (dicionário e-mail -> usuário)"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Erro ao carregar usuários: {e}")
+        return {}
+
+
+class JsonStorage:
+    """Usuários em um dicionário por e-mail, salvos inteiros no users.json.
+
+    Um segundo dicionário por id (os mesmos objetos) atende a verificação do
+    token e a atualização do perfil sem percorrer todos os usuários.
+    """
+
+    backend = BACKEND_JSON
+
+    def __init__(self, users_file, chat_journal, exclusive=True):
+        self.users_file = users_file
+        self.chat_journal = chat_journal
+        self.exclusive = exclusive
+        self.users = {}
+        self.users_by_id = {}
+        self._next_id = 1
+        self._id_lock = threading.Lock()
+        self._lock_file = None
+
+    def load(self):
+        if self.exclusive:
+            self._acquire_process_lock()
+        self.users = load_users_file(self.users_file)
+        self.users_by_id = {user['id']: user for user in self.users.values()}
+        self._next_id = max((int(u['id']) for u in self.users.values() if str(u['id']).isdigit()), default=0) + 1
+        self.chat_journal.load()
+        return self
+
+    def get_user_by_email(self, email):
+        return self.users.get(email)
+
+    def get_user_by_id(self, user_id):
+        return self.users_by_id.get(user_id)
+
+    def count_users(self):
+        return len(self.users)
+
+    def allocate_user_id(self):
+        with self._id_lock:
+            user_id = self._next_id
+            self._next_id += 1
+        return str(user_id)
+
+    def add_user(self, user):
+        self.write_batch([(USER_OP, user, None)])
+
+    def update_user(self, user, old_email):
+        self.write_batch([(USER_OP, user, old_email)])
+
+    def recent_messages(self, user_id, limit):
+        return self.chat_journal.get(user_id)[-limit:]
+
+    def append_messages(self, user_id, messages):
+        self.write_batch([(MESSAGES_OP, user_id, messages)])
+
+    def write_batch(self, ops):
+        """Aplica as operações; o users.json é reescrito uma vez por lote e o journal recebe um único fsync"""
+        records = []
+        users_changed = False
+        for op in ops:
+            if op[0] == USER_OP:
+                _, user, old_email = op
+                if old_email is not None and old_email != user['email']:
+                    self.users.pop(old_email, None)
+                replaced = self.users.get(user['email'])
+                if replaced is not None and replaced['id'] != user['id']:
+                    self.users_by_id.pop(replaced['id'], None)
+                self.users[user['email']] = user
+                self.users_by_id[user['id']] = user
+                users_changed = True
+                if old_email is None:
+                    records.append({'op': 'create', 'user': user['id']})
+            else:
+                records.append({'op': 'append', 'user': op[1], 'messages': op[2]})
+        if records:
+            self.chat_journal.write_batch(records)
+        if users_changed:
+            self._save_users()
+
+    def close(self):
+        self.chat_journal.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def stats(self):
+        return {
+            'backend': self.backend,
+            'users': len(self.users),
+            'chat_journal': self.chat_journal.stats()
+        }
+
+    def _acquire_process_lock(self):
+        # Cada processo teria sua própria cópia dos dados e sobrescreveria os arquivos dos outros
+        if fcntl is None:
+            return
+        self._lock_file = open(self.users_file + '.lock', 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(
+                'Os arquivos JSON já estão em uso por outro processo; '
+                'com vários workers use STORAGE_BACKEND=sqlite'
+            )
+
+    def _save_users(self):
+        try:
+            with open(self.users_file, 'w', encoding='utf-8') as f:
+                json.dump(self.users, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            print(f"Erro ao salvar usuários: {e}")
+
+
+class SqliteStorage:
+    """Usuários e mensagens em SQLite (WAL).
+
+    Uma conexão compartilhada protegida por lock, como no cache de respostas;
+    o WAL deixa outros processos lerem enquanto este grava. As consultas dos
+    caminhos quentes (login, verificação, leitura e gravação do histórico)
+    são SQL fixo com parâmetros, então o sqlite3 as compila uma vez e
+    reaproveita o statement preparado do seu cache.
+    """
+
+    backend = BACKEND_SQLITE
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS users ('
+        ' id TEXT PRIMARY KEY,'
+        ' email TEXT NOT NULL UNIQUE,'
+        ' data TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS counters ('
+        ' name TEXT PRIMARY KEY,'
+        ' value INTEGER NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS messages ('
+        ' user_id TEXT NOT NULL,'
+        ' seq INTEGER NOT NULL,'
+        ' role TEXT NOT NULL,'
+        ' text TEXT NOT NULL,'
+        ' created_at REAL NOT NULL,'
+        ' PRIMARY KEY (user_id, seq)) WITHOUT ROWID'
+    )
+
+    SELECT_USER_BY_EMAIL = 'SELECT data FROM users WHERE email = ?'
+    SELECT_USER_BY_ID = 'SELECT data FROM users WHERE id = ?'
+    INSERT_USER = 'INSERT INTO users (id, email, data) VALUES (?, ?, ?)'
+    UPDATE_USER = 'UPDATE users SET email = ?, data = ? WHERE id = ?'
+    COUNT_USERS = 'SELECT COUNT(*) FROM users'
+    MAX_USER_ID = 'SELECT COALESCE(MAX(CAST(id AS INTEGER)), 0) FROM users'
+    SELECT_COUNTER = 'SELECT value FROM counters WHERE name = ?'
+    UPDATE_COUNTER = 'INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)'
+    SELECT_LAST_SEQ = 'SELECT COALESCE(MAX(seq), 0) FROM messages WHERE user_id = ?'
+    INSERT_MESSAGE = 'INSERT INTO messages (user_id, seq, role, text, created_at) VALUES (?, ?, ?, ?, ?)'
+    TRIM_MESSAGES = 'DELETE FROM messages WHERE user_id = ? AND seq <= ?'
+    SELECT_RECENT_MESSAGES = 'SELECT role, text, created_at FROM messages WHERE user_id = ? ORDER BY seq DESC LIMIT ?'
+
+    def __init__(self, path, max_messages=20, synchronous='NORMAL', busy_timeout=5.0):
+        self.path = path
+        self.max_messages = max_messages
+        self._db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None,
+                                   check_same_thread=False, cached_statements=64)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(f'PRAGMA synchronous={synchronous}')
+        for statement in self.SCHEMA:
+            self._db.execute(statement)
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+
+    def load(self):
+        return self
+
+    def get_user_by_email(self, email):
+        return self._fetch_user(self.SELECT_USER_BY_EMAIL, email)
+
+    def get_user_by_id(self, user_id):
+        return self._fetch_user(self.SELECT_USER_BY_ID, user_id)
+
+    def count_users(self):
+        with self._lock:
+            return self._db.execute(self.COUNT_USERS).fetchone()[0]
+
+    def allocate_user_id(self):
+        """Reserva o próximo id em uma transação, então dois workers nunca recebem o mesmo"""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(self.SELECT_COUNTER, ('user_id',)).fetchone()
+                user_id = (row[0] if row else self._db.execute(self.MAX_USER_ID).fetchone()[0]) + 1
+                self._db.execute(self.UPDATE_COUNTER, ('user_id', user_id))
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        return str(user_id)
+
+    def add_user(self, user):
+        self.write_batch([(USER_OP, user, None)])
+
+    def update_user(self, user, old_email):
+        self.write_batch([(USER_OP, user, old_email)])
+
+    def recent_messages(self, user_id, limit):
+        with self._lock:
+            rows = self._db.execute(self.SELECT_RECENT_MESSAGES, (user_id, limit)).fetchall()
+            self.reads += 1
+        return [{'role': role, 'text': text, 'ts': int(created_at)} for role, text, created_at in reversed(rows)]
+
+    def append_messages(self, user_id, messages):
+        self.write_batch([(MESSAGES_OP, user_id, messages)])
+
+    def write_batch(self, ops):
+        """Aplica as operações em uma única transação (um commit para o lote inteiro)"""
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                for op in ops:
+                    if op[0] == USER_OP:
+                        _, user, old_email = op
+                        if old_email is None:
+                            self._db.execute(self.INSERT_USER, (user['id'], user['email'], self._dump(user)))
+                        else:
+                            self._db.execute(self.UPDATE_USER, (user['email'], self._dump(user), user['id']))
+                    else:
+                        self._append_messages(op[1], op[2], now)
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+            self.writes += len(ops)
+            self.commits += 1
+
+    def import_json(self, users, histories):
+        """Importa os usuários e os pares (usuário, histórico) dos arquivos JSON; não faz nada se o banco já tiver usuários"""
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE: se vários workers iniciarem juntos, só um importa
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                if self._db.execute(self.COUNT_USERS).fetchone()[0]:
+                    self._db.execute('ROLLBACK')
+                    return False
+                self._db.executemany(self.INSERT_USER, [
+                    (user['id'], email, self._dump(user)) for email, user in users.items()
+                ])
+                for user_id, history in histories:
+                    history = [decode_message(msg) for msg in history[-self.max_messages:]]
+                    self._db.executemany(self.INSERT_MESSAGE, [
+                        (user_id, i + 1, msg['role'], msg['text'], msg['ts'] or now)
+                        for i, msg in enumerate(history)
+                    ])
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        return True
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'path': self.path,
+                'reads': self.reads,
+                'writes': self.writes,
+                'commits': self.commits
+            }
+
+    def _append_messages(self, user_id, messages, now):
+        # Chamado dentro de uma transação
+        seq = self._db.execute(self.SELECT_LAST_SEQ, (user_id,)).fetchone()[0]
+        self._db.executemany(self.INSERT_MESSAGE, [
+            (user_id, seq + i + 1, msg['role'], msg['text'], msg.get('ts') or now) for i, msg in enumerate(messages)
+        ])
+        seq += len(messages)
+        # Manter só as últimas mensagens, como no histórico em JSON
+        self._db.execute(self.TRIM_MESSAGES, (user_id, seq - self.max_messages))
+
+    def _fetch_user(self, query, value):
+        with self._lock:
+            row = self._db.execute(query, (value,)).fetchone()
+            self.reads += 1
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _dump(user):
+        return json.dumps(user, ensure_ascii=False, separators=(',', ':'))
@@ -0,0 +1,195 @@
+"""Persistência em segundo plano (write-behind) com group commit"""
+import threading
+import time
+from collections import deque
+
+from storage import MESSAGES_OP, USER_OP
+
+MODE_SYNC = 'sync'        # grava na thread da requisição (um commit por gravação)
+MODE_BATCHED = 'batched'  # a requisição espera o commit do lote em que entrou
+MODE_ASYNC = 'async'      # a requisição não espera; o lote é gravado depois
+
+
+class WriteBehind:
+    """Fila de gravações pendentes na frente de um backend de armazenamento.
+
+    Uma thread grava as operações enfileiradas em lotes de até `batch_size`,
+    cada um com um único commit/fsync para todas as requisições que entraram
+    nele. No modo batched o lote é o que se acumulou durante o commit
+    anterior (group commit); no modo async a thread espera o lote encher ou
+    `interval` segundos se passarem. As leituras consideram o que ainda está
+    na fila, então quem grava sempre enxerga o que gravou. Com a fila cheia
+    (`max_queue`), quem grava espera o próximo lote.
+    """
+
+    def __init__(self, storage, mode=MODE_BATCHED, batch_size=100, interval=0.05,
+                 max_queue=10000, flush_timeout=30.0, window=200):
+        self.storage = storage
+        self.backend = storage.backend
+        self.mode = mode
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_queue = max_queue
+        self.flush_timeout = flush_timeout
+        self._queue = []
+        self._enqueued = 0
+        self._flushed = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # Mantido durante a gravação de um lote: as leituras nunca veem o lote no disco e na fila ao mesmo tempo
+        self._flush_lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.flushes = 0
+        self.flush_errors = 0
+        self.max_batch = 0
+        self._thread = None
+        if mode != MODE_SYNC:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def get_user_by_email(self, email):
+        with self._flush_lock:
+            with self._lock:
+                for op in reversed(self._queue):
+                    if op[0] != USER_OP:
+                        continue
+                    if op[1]['email'] == email:
+                        return dict(op[1])
+                    if op[2] == email:
+                        # E-mail trocado por uma atualização ainda na fila
+                        return None
+            return self.storage.get_user_by_email(email)
+
+    def get_user_by_id(self, user_id):
+        with self._flush_lock:
+            with self._lock:
+                for op in reversed(self._queue):
+                    if op[0] == USER_OP and op[1]['id'] == user_id:
+                        return dict(op[1])
+            return self.storage.get_user_by_id(user_id)
+
+    def count_users(self):
+        with self._flush_lock:
+            with self._lock:
+                pending = sum(1 for op in self._queue if op[0] == USER_OP and op[2] is None)
+            return self.storage.count_users() + pending
+
+    def allocate_user_id(self):
+        return self.storage.allocate_user_id()
+
+    def add_user(self, user):
+        self._submit((USER_OP, dict(user), None))
+
+    def update_user(self, user, old_email):
+        self._submit((USER_OP, dict(user), old_email))
+
+    def recent_messages(self, user_id, limit):
+        with self._flush_lock:
+            with self._lock:
+                pending = [msg for op in self._queue if op[0] == MESSAGES_OP and op[1] == user_id for msg in op[2]]
+            history = self.storage.recent_messages(user_id, limit)
+        return (history + pending)[-limit:] if pending else history
+
+    def append_messages(self, user_id, messages):
+        self._submit((MESSAGES_OP, user_id, messages))
+
+    def flush(self):
+        """Grava tudo o que estiver na fila"""
+        while self._flush_once():
+            pass
+
+    def close(self):
+        """Grava as operações pendentes e fecha o backend (pode ser chamado mais de uma vez)"""
+        with self._changed:
+            if self._closed:
+                return
+            self._closed = True
+            self._changed.notify_all()
+        if self._thread is not None:
+            self._thread.join(self.flush_timeout)
+        self.flush()
+        self.storage.close()
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._latencies)
+            persistence = {
+                'mode': self.mode,
+                'queue_depth': len(self._queue),
+                'flushes': self.flushes,
+                'flushed_ops': self._flushed,
+                'flush_errors': self.flush_errors,
+                'max_batch': self.max_batch,
+                'flush_ms_p50': round(samples[len(samples) // 2] * 1000, 2) if samples else None,
+                'flush_ms_p95': round(samples[int(len(samples) * 0.95)] * 1000, 2) if samples else None,
+                'flush_ms_max': round(samples[-1] * 1000, 2) if samples else None
+            }
+        return dict(self.storage.stats(), persistence=persistence)
+
+    def _submit(self, op):
+        if self.mode == MODE_SYNC or self._closed:
+            started = time.monotonic()
+            with self._flush_lock:
+                self.storage.write_batch([op])
+            with self._lock:
+                self._flushed += 1
+                self._record_flush(1, started)
+            return
+
+        with self._changed:
+            # Fila cheia: esperar o próximo lote (backpressure)
+            if not self._changed.wait_for(lambda: len(self._queue) < self.max_queue, self.flush_timeout):
+                raise TimeoutError('Fila de gravação cheia')
+            self._queue.append(op)
+            self._enqueued += 1
+            target = self._enqueued
+            self._changed.notify_all()
+            if self.mode == MODE_ASYNC:
+                return
+            if not self._changed.wait_for(lambda: self._flushed >= target, self.flush_timeout):
+                raise TimeoutError('Gravação não confirmada no prazo')
+
+    def _run(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._queue or self._closed)
+                if self._closed:
+                    return
+                if self.mode == MODE_ASYNC:
+                    # Ninguém espera pelo lote: aguardar ele encher ou o intervalo passar
+                    started = time.monotonic()
+                    self._changed.wait_for(
+                        lambda: len(self._queue) >= self.batch_size or self._closed
+                        or time.monotonic() - started >= self.interval,
+                        self.interval
+                    )
+            try:
+                self._flush_once()
+            except Exception as e:
+                with self._lock:
+                    self.flush_errors += 1
+                print(f"Erro ao gravar dados pendentes: {e}")
+                time.sleep(self.interval)
+
+    def _flush_once(self):
+        """Grava um lote; retorna False se a fila estiver vazia"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._queue[:self.batch_size]
+            if not batch:
+                return False
+            started = time.monotonic()
+            self.storage.write_batch(batch)
+            with self._changed:
+                del self._queue[:len(batch)]
+                self._flushed += len(batch)
+                self._record_flush(len(batch), started)
+                self._changed.notify_all()
+        return True
+
+    def _record_flush(self, size, started):
+        # Chamado com o lock adquirido
+        self._latencies.append(time.monotonic() - started)
+        self.flushes += 1
+        self.max_batch = max(self.max_batch, size)